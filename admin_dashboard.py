@@ -5,289 +5,826 @@ Works with ANY database schema by detecting columns dynamically
 
 UPDATED: Now reads initial_capital and last_known_balance from follower_users
 (consolidated schema) with fallback to portfolio_users for backwards compatibility.
+
+UPDATED: Connections are borrowed from a shared ThreadedConnectionPool instead
+of opening a fresh psycopg2 connection (TCP + TLS + auth) for every query.
+
+UPDATED: Stats, user list and recent errors are cached in-process for a few
+seconds so several open admin tabs share one set of queries; concurrent
+misses wait for a single load instead of all hitting the database.
+
+UPDATED: Per-user error counts come from the mv_admin_error_rollup
+materialized view, refreshed in the background every minute.
+
+UPDATED: Unbounded scans (full error log export) stream through a server-side
+cursor via iter_rows() instead of buffering the whole result set.
+
+UPDATED: Hot dashboard reads run as server-side prepared statements, PREPAREd
+once per pooled connection and EXECUTEd by name afterwards.
+
+UPDATED: /admin sends a weak ETag built from Postgres' per-table write
+counters, so reloads with nothing new get a 304 without running the queries.
+The probe runs on the shared asyncpg pool from db.py.
+
+UPDATED: log_error() and log_agent_event() queue rows for a background writer
+that inserts them in batches (execute_values), so error storms and heartbeats
+don't cost one commit per row.
 """
 
 import os
+import io
+import logging
+import json
+import csv
 import html
+import time
+import uuid
+import queue
+import atexit
+import asyncio
+import hashlib
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
 import psycopg2
+import psycopg2.extensions
+from psycopg2 import pool as pg_pool
+from psycopg2.extras import execute_values, Json
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from typing import Any, Callable, List, Dict, Optional, Iterator
+
+from db import get_pool as get_async_pool
+
+logger = logging.getLogger("ADMIN_DASHBOARD")
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD", "changeme123")
 
+# Connection pool settings (shared by the dashboard, admin endpoints and
+# agent log endpoints; a dashboard render alone runs 4 reads concurrently)
+POOL_MIN_CONN = int(os.getenv("DB_POOL_MIN_CONN", "2"))
+POOL_MAX_CONN = int(os.getenv("DB_POOL_MAX_CONN", "20"))
+
+# Dashboard result cache TTL (seconds)
+DASHBOARD_CACHE_TTL = 30
+
+# Schema introspection cache TTL (seconds)
+SCHEMA_CACHE_TTL = 60
+
+# Rendered admin page cache TTL (seconds)
+ADMIN_HTML_CACHE_TTL = 5
+
+# How often mv_admin_error_rollup is refreshed (seconds)
+ROLLUP_REFRESH_SECONDS = 60
+
+# Relations the user list and stats probe for, fetched together (see prefetch_schema)
+_DASHBOARD_SCHEMA_TABLES = ('follower_users', 'portfolio_users')
+_DASHBOARD_SCHEMA_VIEWS = ('mv_admin_error_rollup',)
+
+# Tables whose writes change what the dashboard shows (see get_dashboard_etag)
+DASHBOARD_TABLES = [
+    'follower_users', 'portfolio_users', 'error_logs',
+    'open_positions', 'trades', 'mv_admin_error_rollup'
+]
+
+# Batched error/agent-event logging: flush every N rows or after this many seconds
+ERROR_LOG_BATCH_SIZE = 100
+ERROR_LOG_FLUSH_SECONDS = 0.5
+ERROR_LOG_QUEUE_SIZE = 10000
+
+# Error History page size; older pages are fetched by id (keyset) on demand
+ERRORS_PAGE_SIZE = 500
+
+# Rows per chunk when streaming the admin page
+STREAM_BATCH_ROWS = 50
+
+_pool: Optional[pg_pool.ThreadedConnectionPool] = None
+_pool_lock = threading.Lock()
+# One slot per pooled connection; get_db() blocks on it instead of exhausting the pool
+_pool_slots = threading.BoundedSemaphore(POOL_MAX_CONN)
+
+_error_log_queue = queue.Queue(maxsize=ERROR_LOG_QUEUE_SIZE)
+_error_log_writer: Optional[threading.Thread] = None
+_error_log_writer_lock = threading.Lock()
+
+# Set once error_logs is known to exist (see error_logs_ready)
+_error_logs_ready = False
+# Set once create_error_logs_table has run in this process
+_schema_initialized = False
+
+
+class DashboardConnection(psycopg2.extensions.connection):
+    """psycopg2 connection that remembers which statements it has PREPAREd"""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared_statements = set()
+
+
+def get_pool() -> pg_pool.ThreadedConnectionPool:
+    """
+    Get the shared psycopg2 connection pool.
+    Creates it on first call (so importing this module never needs a live DB).
+    """
+    global _pool
+    
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = pg_pool.ThreadedConnectionPool(
+                    POOL_MIN_CONN, POOL_MAX_CONN, DATABASE_URL,
+                    connection_factory=DashboardConnection
+                )
+    return _pool
+
+
+@contextmanager
+def get_db(readonly: bool = False):
+    """
+    Borrow a pooled connection for the duration of a `with` block.
+    
+    The block runs inside `with conn:` so it commits on success and rolls back
+    on error. Broken connections are discarded instead of returned to the pool.
+    Waits for a free slot when every pooled connection is in use (the pool
+    itself would raise instead).
+    
+    readonly=True runs the block in autocommit mode instead, so a
+    single-statement read skips the implicit BEGIN and the COMMIT round-trip.
+    Keep the default for writes, multi-statement reads that need one snapshot,
+    and named (server-side) cursors, which require a transaction.
+    """
+    db_pool = get_pool()
+    with _pool_slots:
+        conn = db_pool.getconn()
+        try:
+            if readonly:
+                conn.autocommit = True
+                yield conn
+            else:
+                with conn:
+                    yield conn
+        finally:
+            if readonly and not conn.closed:
+                conn.autocommit = False
+            db_pool.putconn(conn, close=bool(conn.closed))
+
+
+def iter_rows(sql: str, params: tuple = (), itersize: int = 1000) -> Iterator[tuple]:
+    """
+    Stream query results through a server-side (named) cursor.
+    
+    Postgres holds the result and hands it over `itersize` rows at a time, so
+    client memory stays flat no matter how many rows match. Use this for
+    unbounded scans; the pooled connection is held until the iterator is
+    exhausted or closed.
+    """
+    with get_db() as conn:
+        with conn.cursor(name=f"srv_{uuid.uuid4().hex}") as cur:
+            cur.itersize = itersize
+            cur.execute(sql, params)
+            yield from cur
+
+
+@lru_cache(maxsize=64)
+def _statement_name(sql: str) -> str:
+    """Stable prepared-statement name derived from the SQL text"""
+    return "admin_" + hashlib.sha1(sql.encode()).hexdigest()[:16]
+
+
+def execute_prepared(cur, sql: str, params: tuple = ()):
+    """
+    Run `sql` as a server-side prepared statement.
+    
+    The first call on a pooled connection sends PREPARE; later calls only send
+    EXECUTE, so Postgres skips parsing and planning. Placeholders must be
+    written as $1, $2, ... (Postgres syntax, not psycopg2's %s).
+    """
+    name = _statement_name(sql)
+    prepared = cur.connection.prepared_statements
+    if name not in prepared:
+        cur.execute(f"PREPARE {name} AS {sql}")
+        prepared.add(name)
+    if params:
+        cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+    else:
+        cur.execute(f"EXECUTE {name}")
+
+
+class DashboardCache:
+    """
+    Simple time-based cache for dashboard query results.
+    
+    Entries older than the TTL are treated as missing and refetched.
+    """
+    
+    def __init__(self, ttl_seconds: int = DASHBOARD_CACHE_TTL):
+        self.cache: Dict[str, tuple] = {}
+        self.ttl = ttl_seconds
+        self._lock = threading.Lock()
+        self._load_locks: Dict[str, threading.Lock] = {}
+    
+    def get(self, key: str):
+        """Get cached value if still valid, else None"""
+        with self._lock:
+            entry = self.cache.get(key)
+            if entry is None:
+                return None
+            value, stored_at = entry
+            if time.time() - stored_at < self.ttl:
+                return value
+            # Expired, remove it
+            del self.cache[key]
+            return None
+    
+    def set(self, key: str, value):
+        """Cache a value"""
+        with self._lock:
+            self.cache[key] = (value, time.time())
+    
+    def get_or_load(self, key: str, loader: Callable[[], Any]):
+        """
+        Get a cached value, or compute it with `loader` and cache it.
+        
+        Concurrent misses on the same key wait for the first caller's load
+        instead of each querying the database. A None result is not cached.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+        with self._lock:
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+        with load_lock:
+            value = self.get(key)
+            if value is None:
+                value = loader()
+                if value is not None:
+                    self.set(key, value)
+            return value
+    
+    def invalidate(self, key: str = None):
+        """Clear one key or the whole cache"""
+        with self._lock:
+            if key:
+                self.cache.pop(key, None)
+            else:
+                self.cache.clear()
+
+
+# Global cache instance for dashboard reads
+dashboard_cache = DashboardCache()
 
-def get_db_connection():
-    return psycopg2.connect(DATABASE_URL)
+# Schema probes (table/column existence) change only on deploys and migrations
+schema_cache = DashboardCache(ttl_seconds=SCHEMA_CACHE_TTL)
+
+# Fully rendered admin pages, keyed by dashboard ETag. Admin writes clear it
+# (note_dashboard_write); other writes show up once pg_stat counters flush
+admin_html_cache = DashboardCache(ttl_seconds=ADMIN_HTML_CACHE_TTL)
 
 
 def table_exists(table_name: str) -> bool:
-    """Check if a table exists"""
+    """Check if a table exists (cached for SCHEMA_CACHE_TTL seconds)"""
+    cached = schema_cache.get(f"table:{table_name}")
+    if cached is not None:
+        return cached
+    
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT EXISTS (
-                SELECT FROM information_schema.tables 
-                WHERE table_name = %s
-            )
-        """, (table_name,))
-        exists = cur.fetchone()[0]
-        cur.close()
-        conn.close()
-        return exists
-    except:
+        with get_db(readonly=True) as conn, conn.cursor() as cur:
+            # Direct catalog lookup (information_schema is a slow, privilege-filtered view)
+            cur.execute("SELECT to_regclass(%s) IS NOT NULL", (table_name,))
+            exists = cur.fetchone()[0]
+    except Exception:
+        return False
+    
+    schema_cache.set(f"table:{table_name}", exists)
+    return exists
+
+
+def matview_exists(view_name: str) -> bool:
+    """Check if a materialized view exists (cached for SCHEMA_CACHE_TTL seconds)"""
+    cached = schema_cache.get(f"matview:{view_name}")
+    if cached is not None:
+        return cached
+    
+    try:
+        with get_db(readonly=True) as conn, conn.cursor() as cur:
+            cur.execute("SELECT EXISTS (SELECT FROM pg_class WHERE oid = to_regclass(%s) AND relkind = 'm')", (view_name,))
+            exists = cur.fetchone()[0]
+    except Exception:
         return False
+    
+    schema_cache.set(f"matview:{view_name}", exists)
+    return exists
 
 
 def get_table_columns(table_name: str) -> List[str]:
-    """Get all column names for a table"""
+    """Get all column names for a table (cached for SCHEMA_CACHE_TTL seconds)"""
+    cached = schema_cache.get(f"columns:{table_name}")
+    if cached is not None:
+        return cached
+    
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT column_name
-            FROM information_schema.columns
-            WHERE table_name = %s
-            ORDER BY ordinal_position
-        """, (table_name,))
-        columns = [row[0] for row in cur.fetchall()]
-        cur.close()
-        conn.close()
-        return columns
-    except:
+        with get_db(readonly=True) as conn, conn.cursor() as cur:
+            cur.execute("""
+                SELECT attname
+                FROM pg_attribute
+                WHERE attrelid = to_regclass(%s)
+                  AND attnum > 0
+                  AND NOT attisdropped
+                ORDER BY attnum
+            """, (table_name,))
+            columns = [row[0] for row in cur.fetchall()]
+    except Exception:
         return []
+    
+    schema_cache.set(f"columns:{table_name}", columns)
+    return columns
+
+
+def prefetch_schema(table_names: tuple, view_names: tuple = ()):
+    """
+    Warm table_exists, get_table_columns and matview_exists for several
+    relations with one catalog query instead of one probe each.
+    
+    Names already cached are skipped; on failure the individual probes
+    simply run as usual.
+    """
+    names = [n for n in table_names if schema_cache.get(f"table:{n}") is None]
+    names += [v for v in view_names if schema_cache.get(f"matview:{v}") is None]
+    if not names:
+        return
+    
+    try:
+        with get_db(readonly=True) as conn, conn.cursor() as cur:
+            cur.execute("""
+                SELECT n,
+                       c.oid IS NOT NULL,
+                       COALESCE(c.relkind = 'm', false),
+                       ARRAY(
+                           SELECT attname::text FROM pg_attribute
+                           WHERE attrelid = c.oid AND attnum > 0 AND NOT attisdropped
+                           ORDER BY attnum
+                       )
+                FROM unnest(%s::text[]) AS n
+                LEFT JOIN pg_class c ON c.oid = to_regclass(n)
+            """, (names,))
+            rows = cur.fetchall()
+    except Exception:
+        return
+    
+    for name, exists, is_matview, columns in rows:
+        if name in view_names:
+            schema_cache.set(f"matview:{name}", is_matview)
+        if name in table_names:
+            schema_cache.set(f"table:{name}", exists)
+            schema_cache.set(f"columns:{name}", columns)
+
+
+def error_logs_ready() -> bool:
+    """
+    Check whether error_logs exists, remembering a positive answer.
+    
+    The table is created at startup and never dropped, so once it exists
+    there's no need to ask the catalog again on every dashboard read.
+    """
+    global _error_logs_ready
+    
+    if not _error_logs_ready:
+        try:
+            with get_db(readonly=True) as conn, conn.cursor() as cur:
+                cur.execute("SELECT to_regclass('error_logs') IS NOT NULL")
+                _error_logs_ready = cur.fetchone()[0]
+        except Exception:
+            return False
+    return _error_logs_ready
 
 
 def create_error_logs_table():
-    """Create monitoring tables and ensure schema is up to date"""
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
-    # Error logs
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS error_logs (
-            id SERIAL PRIMARY KEY,
-            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            api_key VARCHAR(100),
-            error_type VARCHAR(100),
-            error_message TEXT,
-            context JSONB
-        )
-    """)
-    
-    # Agent logs
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS agent_logs (
-            id SERIAL PRIMARY KEY,
-            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            api_key VARCHAR(100),
-            event_type VARCHAR(100),
-            event_data JSONB
-        )
-    """)
+    """
+    Create monitoring tables and ensure schema is up to date.
     
-    # Trades table is created by position_monitor.py
-    # No need to create it here as it has a different schema
+    Runs once per process (at startup); later calls return immediately.
+    """
+    global _error_logs_ready, _schema_initialized
     
-    # Indexes
-    cur.execute("CREATE INDEX IF NOT EXISTS idx_error_logs_timestamp ON error_logs(timestamp DESC)")
-    cur.execute("CREATE INDEX IF NOT EXISTS idx_agent_logs_timestamp ON agent_logs(timestamp DESC)")
-    cur.execute("CREATE INDEX IF NOT EXISTS idx_trades_closed_at ON trades(closed_at DESC)")
+    if _schema_initialized:
+        return
     
-    # ========== SCHEMA MIGRATIONS ==========
-    # Add fee_tier column to follower_users if it doesn't exist
-    try:
+    with get_db() as conn, conn.cursor() as cur:
+        # Tables and indexes go out as one multi-statement string: a single
+        # round-trip, committed once with the migration below.
+        # Trades table is created by position_monitor.py (different schema).
+        # Per-key lookups (/api/agent-logs, /api/my-errors) filter on api_key
+        # and read newest-first, so the *_key_ts indexes serve them without a sort.
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS error_logs (
+                id SERIAL PRIMARY KEY,
+                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                api_key VARCHAR(100),
+                error_type VARCHAR(100),
+                error_message TEXT,
+                context JSONB
+            );
+            CREATE TABLE IF NOT EXISTS agent_logs (
+                id SERIAL PRIMARY KEY,
+                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                api_key VARCHAR(100),
+                event_type VARCHAR(100),
+                event_data JSONB
+            );
+            CREATE INDEX IF NOT EXISTS idx_error_logs_timestamp ON error_logs(timestamp DESC);
+            CREATE INDEX IF NOT EXISTS idx_agent_logs_timestamp ON agent_logs(timestamp DESC);
+            CREATE INDEX IF NOT EXISTS idx_trades_closed_at ON trades(closed_at DESC);
+            CREATE INDEX IF NOT EXISTS idx_agent_logs_key_ts ON agent_logs(api_key, timestamp DESC);
+            CREATE INDEX IF NOT EXISTS idx_error_logs_key_ts ON error_logs(api_key, timestamp DESC);
+        """)
+        
+        # ========== SCHEMA MIGRATIONS ==========
+        # Add fee_tier column to follower_users if it doesn't exist
+        try:
+            cur.execute("""
+                ALTER TABLE follower_users 
+                ADD COLUMN IF NOT EXISTS fee_tier VARCHAR(20) DEFAULT 'standard'
+            """)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            logger.warning(f"fee_tier column may already exist: {e}")
+    
+    _error_logs_ready = True
+    _schema_initialized = True
+    schema_cache.invalidate()
+    create_concurrent_indexes()
+
+
+# (name, definition) for indexes on live, busy tables, built CONCURRENTLY
+_CONCURRENT_INDEXES = (
+    # Per-user trade aggregates (balance checks, portfolio stats) filter on
+    # user_id + closed_at and sum profit_usd: index-only scans
+    ('idx_trades_user_closed_at',
+     'trades(user_id, closed_at DESC) INCLUDE (profit_usd)'),
+    # The trading loop polls for running agents every cycle; only a small
+    # slice of follower_users is active, so a partial index finds it directly
+    ('idx_follower_users_running',
+     'follower_users(id) WHERE agent_active = true AND credentials_set = true'),
+)
+
+
+def create_concurrent_indexes():
+    """
+    Indexes on the hot trade/user read paths (see _CONCURRENT_INDEXES).
+    
+    Built CONCURRENTLY so live inserts and updates aren't blocked, which needs
+    an autocommit connection (not get_db's transaction) and one statement
+    per index.
+    """
+    db_pool = get_pool()
+    with _pool_slots:
+        conn = db_pool.getconn()
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                for name, definition in _CONCURRENT_INDEXES:
+                    try:
+                        cur.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {definition}")
+                    except Exception as e:
+                        logger.warning(f"Could not create index {name}: {e}")
+        finally:
+            if not conn.closed:
+                conn.autocommit = False
+            db_pool.putconn(conn, close=bool(conn.closed))
+
+
+def create_admin_rollups():
+    """
+    Create the dashboard roll-up materialized view if it doesn't exist.
+    
+    mv_admin_error_rollup pre-aggregates error_logs per api_key so the
+    dashboard reads a handful of rows instead of scanning the error window
+    on every render. The unique index is required for REFRESH ... CONCURRENTLY.
+    """
+    with get_db() as conn, conn.cursor() as cur:
         cur.execute("""
-            ALTER TABLE follower_users 
-            ADD COLUMN IF NOT EXISTS fee_tier VARCHAR(20) DEFAULT 'standard'
+            CREATE MATERIALIZED VIEW IF NOT EXISTS mv_admin_error_rollup AS
+            SELECT 
+                api_key,
+                COUNT(*) as errors_24h,
+                COUNT(*) FILTER (WHERE timestamp > NOW() - INTERVAL '1 hour') as errors_1h
+            FROM error_logs
+            WHERE timestamp > NOW() - INTERVAL '24 hours'
+            GROUP BY api_key
         """)
-        conn.commit()
+        cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_admin_error_rollup_api_key ON mv_admin_error_rollup(api_key)")
+    
+    schema_cache.invalidate()
+
+
+def refresh_admin_rollups():
+    """Refresh dashboard roll-ups without blocking readers"""
+    with get_db() as conn, conn.cursor() as cur:
+        cur.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY mv_admin_error_rollup")
+
+
+async def start_admin_rollup_refresher(interval_seconds: int = ROLLUP_REFRESH_SECONDS):
+    """
+    Keep mv_admin_error_rollup fresh in the background.
+    
+    Call from main.py startup:
+        asyncio.create_task(start_admin_rollup_refresher())
+    """
+    while True:
+        try:
+            if error_logs_ready():
+                if not matview_exists('mv_admin_error_rollup'):
+                    await asyncio.to_thread(create_admin_rollups)
+                else:
+                    await asyncio.to_thread(refresh_admin_rollups)
+        except Exception as e:
+            logger.error(f"Error refreshing admin roll-ups: {e}")
+        
+        await asyncio.sleep(interval_seconds)
+
+
+# Admin writes made by this process. pg_stat counters can lag a commit by
+# several seconds, so the ETag carries this too: a reload right after a
+# tier change or delete must not get a 304 for the old page.
+_admin_writes = 0
+_admin_writes_lock = threading.Lock()
+
+
+def note_dashboard_write():
+    """Record an admin write: move the ETag and drop cached reads and pages"""
+    global _admin_writes
+    with _admin_writes_lock:
+        _admin_writes += 1
+    dashboard_cache.invalidate()
+    admin_html_cache.invalidate()
+
+
+async def get_dashboard_etag() -> Optional[str]:
+    """
+    Cheap "has anything changed?" check for the admin page.
+    
+    Sums the insert/update/delete counters Postgres keeps for every table the
+    dashboard reads - one catalog lookup, no table scans. When the tag moves,
+    the cached dashboard results are dropped so the next render is fresh.
+    Postgres flushes those counters late, so admin writes made through this
+    process are also folded in (see note_dashboard_write).
+    
+    Runs on the shared asyncpg pool (db.py), so an unchanged reload is answered
+    without a worker thread or a psycopg2 connection.
+    
+    Returns None if the probe fails (caller should just render).
+    """
+    try:
+        db_pool = await get_async_pool()
+        async with db_pool.acquire() as conn:
+            writes = await conn.fetchval("""
+                SELECT COALESCE(SUM(n_tup_ins + n_tup_upd + n_tup_del), 0)
+                FROM pg_stat_user_tables
+                WHERE relname = ANY($1::text[])
+            """, DASHBOARD_TABLES)
+        etag = f'W/"{writes}-{_admin_writes}"'
     except Exception as e:
-        conn.rollback()
-        print(f"Note: fee_tier column may already exist: {e}")
+        logger.error(f"Error computing dashboard ETag: {e}")
+        return None
     
-    conn.commit()
-    cur.close()
-    conn.close()
+    if dashboard_cache.get('etag') != etag:
+        dashboard_cache.invalidate()
+        dashboard_cache.set('etag', etag)
+    return etag
+
+
+# (agent_active, credentials_set) -> (agent_status, status_text, status_emoji)
+USER_STATUS = {
+    (True, True): ('active', 'Active', '🟢'),
+    (True, False): ('active', 'Active', '🟢'),
+    (False, True): ('configured', 'Ready', '🟡'),
+    (False, False): ('pending', 'Pending', '⏳'),
+}
 
 
 def get_all_users_with_status() -> List[Dict]:
     """Get all users from follower_users table with portfolio data"""
-    conn = get_db_connection()
-    cur = conn.cursor()
+    return dashboard_cache.get_or_load('users', _load_users_with_status) or []
+
+
+def _load_users_with_status() -> Optional[List[Dict]]:
+    """Query the user list; None on failure so the miss is not cached"""
+    prefetch_schema(_DASHBOARD_SCHEMA_TABLES, _DASHBOARD_SCHEMA_VIEWS)
     
     # Check if follower_users table exists
     if not table_exists('follower_users'):
-        cur.close()
-        conn.close()
         return []
     
+    # Schema probes borrow their own connection, so run them before checkout
+    fu_columns = get_table_columns('follower_users')
+    has_error_logs = error_logs_ready()
+    has_error_rollup = has_error_logs and matview_exists('mv_admin_error_rollup')
+    
     try:
-        # Check if follower_users has consolidated columns (initial_capital, last_known_balance)
-        fu_columns = get_table_columns('follower_users')
-        has_consolidated = 'initial_capital' in fu_columns and 'last_known_balance' in fu_columns
-        
-        if has_consolidated:
-            # NEW: Read directly from follower_users (consolidated schema)
-            cur.execute("""
-                SELECT 
-                    fu.email,
-                    fu.api_key,
-                    fu.credentials_set,
-                    fu.agent_active,
-                    fu.total_profit,
-                    fu.total_trades,
-                    fu.created_at,
-                    COALESCE(fu.initial_capital, 0) as initial_capital,
-                    COALESCE(fu.last_known_balance, 0) as current_balance,
-                    fu.kraken_account_id
-                FROM follower_users fu
-                ORDER BY fu.id DESC
-            """)
-        else:
-            # FALLBACK: Join with portfolio_users (legacy schema)
-            cur.execute("""
-                SELECT 
-                    fu.email,
-                    fu.api_key,
-                    fu.credentials_set,
-                    fu.agent_active,
-                    fu.total_profit,
-                    fu.total_trades,
-                    fu.created_at,
-                    COALESCE(pu.initial_capital, 0) as initial_capital,
-                    COALESCE(pu.last_known_balance, 0) as current_balance,
-                    fu.kraken_account_id
-                FROM follower_users fu
-                LEFT JOIN portfolio_users pu ON fu.api_key = pu.api_key
-                ORDER BY fu.id DESC
-            """)
-        
-        users = []
-        for row in cur.fetchall():
-            email, api_key, credentials_set, agent_active, total_profit, total_trades, created_at, initial_capital, current_balance, kraken_account_id = row
+        # Server-side cursor: Postgres streams the user rows 500 at a time
+        with get_db() as conn, conn.cursor(name=f"users_scan_{uuid.uuid4().hex}") as cur:
+            cur.itersize = 500
             
-            # Determine status
-            if agent_active:
-                status = {'status': 'active', 'status_text': 'Active', 'emoji': '🟢'}
-            elif credentials_set:
-                status = {'status': 'configured', 'status_text': 'Ready', 'emoji': '🟡'}
+            # Check if follower_users has consolidated columns (initial_capital, last_known_balance)
+            has_consolidated = 'initial_capital' in fu_columns and 'last_known_balance' in fu_columns
+            
+            if has_consolidated:
+                # NEW: Read directly from follower_users (consolidated schema)
+                capital_source = "fu"
+                portfolio_join = ""
             else:
-                status = {'status': 'pending', 'status_text': 'Pending', 'emoji': '⏳'}
+                # FALLBACK: Join with portfolio_users (legacy schema)
+                capital_source = "pu"
+                portfolio_join = "LEFT JOIN portfolio_users pu ON fu.api_key = pu.api_key"
+            capital = f"COALESCE({capital_source}.initial_capital, 0)"
+            fee_tier = "COALESCE(fu.fee_tier, 'standard')" if 'fee_tier' in fu_columns else "'standard'"
             
-            # Calculate ROI
-            capital = float(initial_capital) if initial_capital else 0
-            profit = float(total_profit) if total_profit else 0
-            roi = (profit / capital * 100) if capital > 0 else 0
+            # Error counts for the last 24h, aggregated once for all users
+            # (instead of one COUNT(*) query per user row). Prefer the
+            # pre-aggregated roll-up; fall back to a live aggregate until it exists.
+            if has_error_rollup:
+                error_count = "COALESCE(el.errors_24h, 0)"
+                error_join = """
+                    LEFT JOIN mv_admin_error_rollup el ON el.api_key = fu.api_key"""
+            elif has_error_logs:
+                error_count = "COALESCE(el.error_count, 0)"
+                error_join = """
+                    LEFT JOIN (
+                        SELECT api_key, COUNT(*) as error_count
+                        FROM error_logs
+                        WHERE timestamp > NOW() - INTERVAL '24 hours'
+                        GROUP BY api_key
+                    ) el ON el.api_key = fu.api_key"""
+            else:
+                error_count = "0"
+                error_join = ""
             
-            # Get error count
-            recent_errors = 0
-            if table_exists('error_logs'):
-                try:
-                    cur.execute("""
-                        SELECT COUNT(*) FROM error_logs 
-                        WHERE api_key = %s AND timestamp > NOW() - INTERVAL '24 hours'
-                    """, (api_key,))
-                    recent_errors = cur.fetchone()[0]
-                except:
-                    pass
+            # Postgres shapes each user as a JSON object that psycopg2 decodes
+            # straight into a dict (ROI and the short Kraken ID are computed
+            # here too). Row-at-a-time objects instead of one json_agg array
+            # keep a large user table from becoming one giant value in memory.
+            cur.execute(f"""
+                SELECT json_build_object(
+                    'id', fu.id,
+                    'email', fu.email,
+                    'api_key_short', COALESCE(left(fu.api_key, 15), ''),
+                    'credentials_set', fu.credentials_set,
+                    'agent_active', fu.agent_active,
+                    'total_trades', COALESCE(fu.total_trades, 0),
+                    'total_profit', COALESCE(fu.total_profit, 0),
+                    'capital', {capital},
+                    'roi', CASE WHEN {capital} > 0
+                                THEN COALESCE(fu.total_profit, 0) / {capital} * 100
+                                ELSE 0 END,
+                    'recent_errors', {error_count},
+                    'kraken_account_id', fu.kraken_account_id,
+                    'kraken_id_display', left(NULLIF(fu.kraken_account_id, ''), 8) || '...',
+                    'fee_tier', {fee_tier}
+                )
+                FROM follower_users fu
+                {portfolio_join}{error_join}
+                ORDER BY fu.id DESC
+            """)
             
-            # Format Kraken account ID for display (show first 8 chars only)
-            kraken_id_display = kraken_account_id[:8] + '...' if kraken_account_id else None
+            users = []
+            for (user,) in cur:
+                status = (bool(user.pop('agent_active')), bool(user.pop('credentials_set')))
+                user['agent_status'], user['status_text'], user['status_emoji'] = USER_STATUS[status]
+                users.append(user)
             
-            users.append({
-                'email': email,
-                'api_key': api_key,
-                'agent_status': status['status'],
-                'status_text': status['status_text'],
-                'status_emoji': status['emoji'],
-                'total_trades': total_trades or 0,
-                'total_profit': profit,
-                'capital': capital,
-                'current_balance': float(current_balance) if current_balance else 0,
-                'roi': roi,
-                'recent_errors': recent_errors,
-                'created_at': created_at,
-                'kraken_account_id': kraken_account_id,
-                'kraken_id_display': kraken_id_display
-            })
-        
-        cur.close()
-        conn.close()
-        return users
+            return users
         
     except Exception as e:
-        print(f"Error in get_all_users_with_status: {e}")
-        cur.close()
-        conn.close()
-        return []
+        logger.error(f"Error in get_all_users_with_status: {e}")
+        return None
 
 
-def get_recent_errors(hours: int = None, limit: int = 500) -> List[Dict]:
-    """Get errors - all historical or filtered by hours
+def get_recent_errors(hours: int = None, limit: int = ERRORS_PAGE_SIZE, before_id: int = None) -> List[Dict]:
+    """Get errors - all historical or filtered by hours, newest first
     
     Args:
         hours: Optional - filter to last X hours. None = all errors
         limit: Max errors to return (prevents lag with thousands)
+        before_id: Optional - only errors older than this error_logs.id
+            (keyset pagination: pass the last id of the previous page)
     """
-    if not table_exists('error_logs'):
+    # Only the newest page is reread often; caching client-chosen cursors
+    # would grow the cache (and its load locks) without bound
+    if before_id is not None:
+        return _load_recent_errors(hours, limit, before_id) or []
+    return dashboard_cache.get_or_load(
+        f'errors:{hours}:{limit}', lambda: _load_recent_errors(hours, limit, before_id)
+    ) or []
+
+
+def _load_recent_errors(hours: Optional[int], limit: int, before_id: Optional[int] = None) -> Optional[List[Dict]]:
+    """Query recent errors; None on failure so the miss is not cached"""
+    if not error_logs_ready():
         return []
     
+    # Build query based on whether we filter by time and/or page. Ordering by
+    # id (insertion order) lets each page start from the primary key instead
+    # of an OFFSET that rescans every newer row.
+    conditions = []
+    params = []
+    if hours:
+        params.append(hours)
+        conditions.append(f"el.timestamp > NOW() - make_interval(hours => ${len(params)})")
+    if before_id:
+        params.append(before_id)
+        conditions.append(f"el.id < ${len(params)}")
+    params.append(limit)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
-        # Build query based on whether we filter by time
-        if hours:
-            cur.execute("""
-                SELECT 
-                    el.timestamp AT TIME ZONE 'UTC' AT TIME ZONE 'Asia/Singapore' as timestamp_sgt,
-                    el.api_key, 
-                    el.error_type, 
-                    el.error_message,
-                    fu.email,
-                    el.context
-                FROM error_logs el
-                LEFT JOIN follower_users fu ON el.api_key = fu.api_key
-                WHERE el.timestamp > NOW() - INTERVAL '%s hours'
-                ORDER BY el.timestamp DESC
-                LIMIT %s
-            """, (hours, limit))
-        else:
-            # Get ALL errors (with reasonable limit)
-            cur.execute("""
+        with get_db(readonly=True) as conn, conn.cursor() as cur:
+            execute_prepared(cur, f"""
                 SELECT 
-                    el.timestamp AT TIME ZONE 'UTC' AT TIME ZONE 'Asia/Singapore' as timestamp_sgt,
+                    el.id,
+                    to_char(el.timestamp AT TIME ZONE 'UTC' AT TIME ZONE 'Asia/Singapore',
+                            'YYYY-MM-DD HH24:MI:SS') || ' SGT' AS timestamp_str,
                     el.api_key, 
                     el.error_type, 
                     el.error_message,
                     fu.email,
-                    el.context
-                FROM error_logs el
+                    el.context,
+                    {_ERROR_CATEGORY_SQL} AS category
+                FROM (
+                    -- Cut the page first so only its rows are joined and categorized
+                    SELECT el.id, el.timestamp, el.api_key, el.error_type, el.error_message, el.context
+                    FROM error_logs el
+                    {where}
+                    ORDER BY el.id DESC
+                    LIMIT ${len(params)}
+                ) el
                 LEFT JOIN follower_users fu ON el.api_key = fu.api_key
-                ORDER BY el.timestamp DESC
-                LIMIT %s
-            """, (limit,))
-        
-        errors = []
-        for row in cur.fetchall():
-            timestamp_sgt, api_key, error_type, error_message, email, context = row
-            errors.append({
-                'timestamp': timestamp_sgt,
-                'api_key': api_key,
-                'error_type': error_type or 'Unknown',
-                'error_message': error_message or '',
-                'email': email or (api_key[:20] + '...' if api_key else 'N/A'),
-                'context': context
-            })
-        
-        cur.close()
-        conn.close()
-        return errors
+                CROSS JOIN LATERAL (
+                    SELECT lower(COALESCE(el.error_type, 'Unknown') || ' ' || COALESCE(el.error_message, '')) AS haystack
+                ) h
+                ORDER BY el.id DESC
+            """, tuple(params))
+            
+            errors = []
+            for row in cur.fetchall():
+                error_id, timestamp_str, api_key, error_type, error_message, email, context, category = row
+                errors.append({
+                    'id': error_id,
+                    'timestamp_str': timestamp_str,
+                    'api_key': api_key,
+                    'error_type': error_type or 'Unknown',
+                    'error_message': error_message or '',
+                    'email': email or (api_key[:20] + '...' if api_key else 'N/A'),
+                    'context': context,
+                    'category': category
+                })
+            
+            return errors
     except Exception as e:
-        print(f"Error getting recent errors: {e}")
-        return []
+        logger.error(f"Error getting recent errors: {e}")
+        return None
+
+
+def iter_error_log_csv(batch_size: int = 1000) -> Iterator[str]:
+    """
+    Stream the FULL error log as CSV (newest first).
+    
+    Rows come from a server-side cursor and are flushed every `batch_size`
+    rows, so exporting 100k errors never materializes them all in memory.
+    """
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(['Timestamp (SGT)', 'Email', 'API Key', 'Error Type', 'Error Message', 'Context'])
+    yield output.getvalue()
+    
+    if not error_logs_ready():
+        return
+    
+    output.seek(0)
+    output.truncate(0)
+    pending = 0
+    for row in iter_rows("""
+        SELECT 
+            el.timestamp AT TIME ZONE 'UTC' AT TIME ZONE 'Asia/Singapore' as timestamp_sgt,
+            fu.email,
+            el.api_key,
+            el.error_type,
+            el.error_message,
+            el.context::text
+        FROM error_logs el
+        LEFT JOIN follower_users fu ON el.api_key = fu.api_key
+        ORDER BY el.timestamp DESC
+    """, itersize=batch_size):
+        writer.writerow(row)
+        pending += 1
+        if pending >= batch_size:
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate(0)
+            pending = 0
+    
+    if pending:
+        yield output.getvalue()
 
 
 def get_positions_needing_review() -> List[Dict]:
@@ -296,70 +833,93 @@ def get_positions_needing_review() -> List[Dict]:
         return []
     
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
-        cur.execute("""
-            SELECT 
-                op.id,
-                op.user_id,
-                fu.email,
-                fu.api_key,
-                op.symbol,
-                op.kraken_symbol,
-                op.side,
-                op.quantity,
-                op.leverage,
-                op.entry_fill_price,
-                op.target_tp,
-                op.target_sl,
-                op.opened_at,
-                op.status
-            FROM open_positions op
-            JOIN follower_users fu ON op.user_id::text = fu.id::text
-            WHERE op.status = 'needs_review'
-            ORDER BY op.opened_at DESC
-        """)
-        
-        positions = []
-        for row in cur.fetchall():
-            pid, user_id, email, api_key, symbol, kraken_symbol, side, qty, leverage, entry, tp, sl, opened_at, status = row
+        with get_db(readonly=True) as conn, conn.cursor() as cur:
+            execute_prepared(cur, """
+                SELECT 
+                    op.id,
+                    op.user_id,
+                    fu.email,
+                    fu.api_key,
+                    op.symbol,
+                    op.kraken_symbol,
+                    op.side,
+                    op.quantity,
+                    op.leverage,
+                    op.entry_fill_price,
+                    op.target_tp,
+                    op.target_sl,
+                    op.opened_at,
+                    op.status
+                FROM open_positions op
+                JOIN follower_users fu ON op.user_id::text = fu.id::text
+                WHERE op.status = 'needs_review'
+                ORDER BY op.opened_at DESC
+            """)
             
-            # Calculate potential P&L if it was closed
-            # (This is theoretical since we don't know actual close price)
-            risk_amount = abs(float(entry) - float(sl)) * float(qty)
-            reward_amount = abs(float(tp) - float(entry)) * float(qty)
+            positions = []
+            for row in cur.fetchall():
+                pid, user_id, email, api_key, symbol, kraken_symbol, side, qty, leverage, entry, tp, sl, opened_at, status = row
+                
+                # Calculate potential P&L if it was closed
+                # (This is theoretical since we don't know actual close price)
+                risk_amount = abs(float(entry) - float(sl)) * float(qty)
+                reward_amount = abs(float(tp) - float(entry)) * float(qty)
+                
+                positions.append({
+                    'id': pid,
+                    'user_id': user_id,
+                    'email': email,
+                    'api_key': api_key[:20] + '...',
+                    'symbol': symbol,
+                    'side': side,
+                    'quantity': float(qty),
+                    'leverage': float(leverage),
+                    'entry': float(entry),
+                    'tp': float(tp),
+                    'sl': float(sl),
+                    'risk_amount': risk_amount,
+                    'reward_amount': reward_amount,
+                    'opened_at': opened_at,
+                    'reason': 'Manual close detected (both TP/SL canceled)'
+                })
             
-            positions.append({
-                'id': pid,
-                'user_id': user_id,
-                'email': email,
-                'api_key': api_key[:20] + '...',
-                'symbol': symbol,
-                'side': side,
-                'quantity': float(qty),
-                'leverage': float(leverage),
-                'entry': float(entry),
-                'tp': float(tp),
-                'sl': float(sl),
-                'risk_amount': risk_amount,
-                'reward_amount': reward_amount,
-                'opened_at': opened_at,
-                'reason': 'Manual close detected (both TP/SL canceled)'
-            })
-        
-        cur.close()
-        conn.close()
-        return positions
+            return positions
     except Exception as e:
-        print(f"Error getting positions needing review: {e}")
+        logger.error(f"Error getting positions needing review: {e}")
         return []
 
 
+# Shown when the stats query fails
+_EMPTY_STATS = {
+    'total_users': 0,
+    'configured_users': 0,
+    'active_now': 0,
+    'active_percent': 0.0,
+    'total_trades': 0,
+    'total_profit': 0.0,
+    'avg_profit': 0.0,
+    'platform_capital': 0.0,
+    'current_value': 0.0,
+    'platform_roi': 0.0,
+    'errors_1h': 0,
+}
+
+
 def get_stats_summary() -> Dict:
     """Get summary statistics from follower_users (consolidated schema)"""
-    conn = get_db_connection()
-    cur = conn.cursor()
+    return dashboard_cache.get_or_load('stats', _load_stats_summary) or dict(_EMPTY_STATS)
+
+
+def _load_stats_summary() -> Dict:
+    """Query the header statistics in one round-trip"""
+    # Schema probes borrow their own connection, so run them before checkout
+    prefetch_schema(_DASHBOARD_SCHEMA_TABLES, _DASHBOARD_SCHEMA_VIEWS)
+    has_follower_users = table_exists('follower_users')
+    has_portfolio_users = table_exists('portfolio_users')
+    has_error_logs = error_logs_ready()
+    has_error_rollup = has_error_logs and matview_exists('mv_admin_error_rollup')
+    fu_columns = get_table_columns('follower_users') if has_follower_users else []
+    has_consolidated = 'initial_capital' in fu_columns and 'last_known_balance' in fu_columns
     
     # Count users from follower_users
     total_users = 0
@@ -368,78 +928,85 @@ def get_stats_summary() -> Dict:
     total_profit = 0.0
     total_trades = 0
     
-    if table_exists('follower_users'):
-        try:
-            cur.execute("SELECT COUNT(*) FROM follower_users")
-            total_users = cur.fetchone()[0]
-            
-            cur.execute("SELECT COUNT(*) FROM follower_users WHERE credentials_set = true")
-            configured_users = cur.fetchone()[0]
-            
-            cur.execute("SELECT COUNT(*) FROM follower_users WHERE agent_active = true")
-            active_now = cur.fetchone()[0]
-            
-            cur.execute("SELECT COALESCE(SUM(total_profit), 0), COALESCE(SUM(total_trades), 0) FROM follower_users")
-            row = cur.fetchone()
-            total_profit = float(row[0]) if row else 0.0
-            total_trades = int(row[1]) if row else 0
-        except Exception as e:
-            print(f"Error getting follower_users stats: {e}")
-    
     # Get platform capital - try follower_users first (consolidated), then portfolio_users (legacy)
     platform_capital = 0.0
     current_value = 0.0
     
-    fu_columns = get_table_columns('follower_users') if table_exists('follower_users') else []
-    has_consolidated = 'initial_capital' in fu_columns and 'last_known_balance' in fu_columns
+    errors_1h = 0
     
-    if has_consolidated:
-        # NEW: Query follower_users directly (consolidated schema)
-        try:
-            cur.execute("""
-                SELECT 
-                    COALESCE(SUM(initial_capital), 0),
-                    COALESCE(SUM(last_known_balance), 0)
-                FROM follower_users
-                WHERE portfolio_initialized = true
-            """)
-            row = cur.fetchone()
-            platform_capital = float(row[0]) if row else 0.0
-            current_value = float(row[1]) if row else 0.0
-        except Exception as e:
-            print(f"Error getting consolidated portfolio stats: {e}")
-    elif table_exists('portfolio_users'):
-        # FALLBACK: Query portfolio_users (legacy schema)
-        try:
-            cur.execute("""
+    # One round-trip: follower aggregates come from a single scan of
+    # follower_users; legacy portfolio totals and the recent-error count ride
+    # along as scalar sub-selects. Probed columns keep every branch valid.
+    has_legacy_aum = (not has_consolidated
+                      and 'last_known_balance' in fu_columns
+                      and 'portfolio_initialized' in fu_columns)
+    if has_follower_users:
+        if has_consolidated:
+            # Consolidated schema also yields platform capital + AUM (sum of
+            # last_known_balance), which matches main dashboard behavior and
+            # reflects withdrawals.
+            capital_columns = """,
+                    COALESCE(SUM(initial_capital) FILTER (WHERE portfolio_initialized = true), 0) AS platform_capital,
+                    COALESCE(SUM(last_known_balance) FILTER (WHERE portfolio_initialized = true), 0) AS current_value"""
+        elif has_legacy_aum:
+            # Legacy schema: AUM may still live on follower_users.last_known_balance
+            capital_columns = """,
+                    COALESCE(SUM(last_known_balance) FILTER (WHERE portfolio_initialized = true), 0) AS current_value"""
+        else:
+            capital_columns = ""
+        follower_stats = f"""
                 SELECT 
-                    COALESCE(SUM(initial_capital), 0),
-                    COALESCE(SUM(last_known_balance), 0)
-                FROM portfolio_users
-            """)
-            row = cur.fetchone()
-            platform_capital = float(row[0]) if row else 0.0
-            current_value = float(row[1]) if row else 0.0
-        except Exception as e:
-            print(f"Error getting portfolio stats: {e}")
+                    COUNT(*) AS total_users,
+                    COUNT(*) FILTER (WHERE credentials_set = true) AS configured_users,
+                    COUNT(*) FILTER (WHERE agent_active = true) AS active_now,
+                    COALESCE(SUM(total_profit), 0) AS total_profit,
+                    COALESCE(SUM(total_trades), 0) AS total_trades{capital_columns}
+                FROM follower_users"""
+    else:
+        follower_stats = """
+                SELECT 0 AS total_users, 0 AS configured_users, 0 AS active_now,
+                       0 AS total_profit, 0 AS total_trades"""
     
-    # Current Value = actual AUM (sum of last_known_balance from follower_users)
-    # This matches main dashboard behavior and reflects withdrawals
-    if table_exists('follower_users'):
-        try:
-            cur.execute("""
-                SELECT COALESCE(SUM(last_known_balance), 0)
-                FROM follower_users
-                WHERE portfolio_initialized = true
-            """)
-            row = cur.fetchone()
-            current_value = float(row[0]) if row else 0.0
-        except Exception as e:
-            print(f"Error getting AUM: {e}")
-            current_value = platform_capital + total_profit  # Fallback
+    if has_consolidated:
+        capital_sql, value_sql = "f.platform_capital", "f.current_value"
+    else:
+        # FALLBACK: portfolio_users (legacy schema)
+        capital_sql = ("(SELECT COALESCE(SUM(initial_capital), 0) FROM portfolio_users)"
+                       if has_portfolio_users else "0")
+        if has_legacy_aum:
+            value_sql = "f.current_value"
+        elif has_portfolio_users and not has_follower_users:
+            value_sql = "(SELECT COALESCE(SUM(last_known_balance), 0) FROM portfolio_users)"
+        else:
+            value_sql = "NULL"  # No AUM column: estimated from capital + profit below
     
-    # Calculate platform ROI (based on profit vs capital invested)
-    platform_roi = (total_profit / platform_capital * 100) if platform_capital > 0 else 0.0
+    if has_error_rollup:
+        errors_sql = "(SELECT COALESCE(SUM(errors_1h), 0)::int FROM mv_admin_error_rollup)"
+    elif has_error_logs:
+        errors_sql = "(SELECT COUNT(*) FROM error_logs WHERE timestamp > NOW() - INTERVAL '1 hour')"
+    else:
+        errors_sql = "0"
+    
+    try:
+        with get_db(readonly=True) as conn, conn.cursor() as cur:
+            # Cast in SQL so psycopg2 hands back floats/ints, not Decimals
+            execute_prepared(cur, f"""
+                SELECT f.total_users, f.configured_users, f.active_now,
+                       f.total_profit::float8, f.total_trades::bigint,
+                       ({capital_sql})::float8, ({value_sql})::float8, ({errors_sql})::int
+                FROM ({follower_stats}
+                ) f
+            """)
+            (total_users, configured_users, active_now, total_profit, total_trades,
+             platform_capital, current_value, errors_1h) = cur.fetchone()
+        if current_value is None:
+            current_value = platform_capital + total_profit
+    except Exception as e:
+        logger.error(f"Error getting stats summary: {e}")
+        return None  # Not cached, so the next request retries
+    
+    # Calculate platform ROI (based on profit vs capital invested)
+    platform_roi = (total_profit / platform_capital * 100) if platform_capital > 0 else 0.0
     
     # Active percentage
     active_percent = (active_now / configured_users * 100) if configured_users > 0 else 0.0
@@ -447,19 +1014,7 @@ def get_stats_summary() -> Dict:
     # Average profit per user
     avg_profit = total_profit / total_users if total_users > 0 else 0.0
     
-    # Count recent errors
-    errors_1h = 0
-    if table_exists('error_logs'):
-        try:
-            cur.execute("SELECT COUNT(*) FROM error_logs WHERE timestamp > NOW() - INTERVAL '1 hour'")
-            errors_1h = cur.fetchone()[0]
-        except:
-            pass
-    
-    cur.close()
-    conn.close()
-    
-    return {
+    stats = {
         'total_users': total_users,
         'configured_users': configured_users,
         'active_now': active_now,
@@ -472,80 +1027,197 @@ def get_stats_summary() -> Dict:
         'platform_roi': platform_roi,
         'errors_1h': errors_1h
     }
+    return stats
 
 
-def log_error(api_key: str, error_type: str, error_message: str, context: Optional[Dict] = None):
-    """Log error"""
-    try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        import json
-        cur.execute(
-            "INSERT INTO error_logs (api_key, error_type, error_message, context) VALUES (%s, %s, %s, %s)",
-            (api_key, error_type, error_message, json.dumps(context) if context else None)
+# json.dumps() with non-default options builds a new JSONEncoder per call;
+# the log paths reuse this one
+_json_encode = json.JSONEncoder(separators=(',', ':'), default=str).encode
+
+
+def dump_json(value) -> str:
+    """
+    Serialize a JSONB payload compactly.
+    
+    No whitespace between tokens keeps error storms cheaper to encode, ship
+    and store; default=str keeps a stray datetime/Decimal in an agent's
+    context from failing the whole log call.
+    """
+    return _json_encode(value)
+
+
+def _jsonb(value) -> Optional[Json]:
+    """
+    Adapt an optional JSONB payload, serialized now with dump_json.
+    
+    Rows wait in the queue for the writer thread; serializing up front means a
+    caller mutating its dict afterwards can't change (or break) the row.
+    """
+    if not value:
+        return None
+    return Json(dump_json(value), dumps=str)  # Already JSON text
+
+
+def _insert_error_rows(rows: List[tuple]):
+    """Write a batch of error_logs rows in one INSERT and one commit"""
+    with get_db() as conn, conn.cursor() as cur:
+        execute_values(
+            cur,
+            "INSERT INTO error_logs (api_key, error_type, error_message, context) VALUES %s",
+            rows
+        )
+
+
+def _insert_agent_rows(rows: List[tuple]):
+    """Write a batch of agent_logs rows in one INSERT and one commit"""
+    with get_db() as conn, conn.cursor() as cur:
+        execute_values(
+            cur,
+            "INSERT INTO agent_logs (api_key, event_type, event_data) VALUES %s",
+            rows
         )
-        conn.commit()
-        cur.close()
-        conn.close()
-    except:
-        pass
+
+
+def _insert_log_rows(table: str, rows: List[tuple]):
+    """Write a batch of rows to error_logs or agent_logs"""
+    if table == 'agent_logs':
+        _insert_agent_rows(rows)
+    else:
+        _insert_error_rows(rows)
+
+
+def _write_log_batch(batch: List[tuple]):
+    """Write queued (table, row) entries with one INSERT per table"""
+    rows_by_table: Dict[str, List[tuple]] = {}
+    for table, row in batch:
+        rows_by_table.setdefault(table, []).append(row)
+    for table, rows in rows_by_table.items():
+        try:
+            _insert_log_rows(table, rows)
+        except Exception as e:
+            if len(rows) == 1:
+                logger.error(f"Error writing {table} row: {e}")
+                continue
+            # One bad row fails the whole INSERT - retry singly so only it is lost
+            logger.warning(f"Error writing {table} batch ({len(rows)} rows), retrying one by one: {e}")
+            for row in rows:
+                try:
+                    _insert_log_rows(table, [row])
+                except Exception as row_error:
+                    logger.error(f"Dropped {table} row {row[:2]}: {row_error}")
+
+
+def _error_log_writer_loop():
+    """Background thread: drain the log queue in batches"""
+    while True:
+        batch = [_error_log_queue.get()]
+        deadline = time.time() + ERROR_LOG_FLUSH_SECONDS
+        while len(batch) < ERROR_LOG_BATCH_SIZE:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(_error_log_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        
+        _write_log_batch(batch)
+
+
+def _ensure_error_log_writer():
+    """Start the error log writer thread on first use"""
+    global _error_log_writer
+    
+    if _error_log_writer is None:
+        with _error_log_writer_lock:
+            if _error_log_writer is None:
+                _error_log_writer = threading.Thread(
+                    target=_error_log_writer_loop, name="error-log-writer", daemon=True
+                )
+                _error_log_writer.start()
+
+
+def flush_error_logs():
+    """Synchronously write any queued error/agent rows (runs at interpreter exit)"""
+    batch = []
+    while True:
+        try:
+            batch.append(_error_log_queue.get_nowait())
+        except queue.Empty:
+            break
+    if batch:
+        _write_log_batch(batch)
+
+
+atexit.register(flush_error_logs)
+
+
+def log_error(api_key: str, error_type: str, error_message: str, context: Optional[Dict] = None):
+    """
+    Log error.
+    
+    Rows are queued and written in batches by a background thread, so an
+    error storm costs one commit per batch instead of one per error. If the
+    queue is full, the row is written immediately so nothing is dropped.
+    """
+    row = (api_key, error_type, error_message, _jsonb(context))
+    
+    _enqueue_log_row('error_logs', row)
 
 
 def log_agent_event(api_key: str, event_type: str, event_data: Optional[Dict] = None):
-    """Log agent event"""
+    """
+    Log agent event.
+    
+    Heartbeats arrive from every running agent, so events share log_error's
+    queue and background writer.
+    """
+    row = (api_key, event_type, _jsonb(event_data))
+    _enqueue_log_row('agent_logs', row)
+
+
+def _enqueue_log_row(table: str, row: tuple):
+    """Queue a row for the writer thread, or write it now if the queue is full"""
+    _ensure_error_log_writer()
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        import json
-        cur.execute(
-            "INSERT INTO agent_logs (api_key, event_type, event_data) VALUES (%s, %s, %s)",
-            (api_key, event_type, json.dumps(event_data) if event_data else None)
-        )
-        conn.commit()
-        cur.close()
-        conn.close()
-    except:
-        pass
+        _error_log_queue.put_nowait((table, row))
+    except queue.Full:
+        try:
+            _insert_log_rows(table, [row])
+        except Exception as e:
+            logger.error(f"Error writing {table} row: {e}")
 
 
-def get_users_by_tier() -> Dict[str, List[Dict]]:
-    """Get all users grouped by fee tier"""
-    conn = get_db_connection()
-    cur = conn.cursor()
+def get_users_by_tier(users: List[Dict] = None) -> Dict[str, List[Dict]]:
+    """
+    Get all users grouped by fee tier
     
+    Grouped from the get_all_users_with_status() rows (pass them in if you
+    already have them) instead of scanning follower_users a second time.
+    """
     result = {
         'team': [],    # 0% fees
         'vip': [],     # 5% fees
         'standard': [] # 10% fees
     }
     
-    try:
-        cur.execute("""
-            SELECT id, email, fee_tier, total_profit, total_trades, agent_active
-            FROM follower_users
-            ORDER BY email
-        """)
-        rows = cur.fetchall()
-        
-        for row in rows:
-            user = {
-                'id': row[0],
-                'email': row[1],
-                'fee_tier': row[2] or 'standard',
-                'total_profit': row[3] or 0,
-                'total_trades': row[4] or 0,
-                'agent_active': row[5] or False
-            }
-            tier = user['fee_tier']
-            if tier in result:
-                result[tier].append(user)
-            else:
-                result['standard'].append(user)
-    except Exception as e:
-        print(f"Error getting users by tier: {e}")
-    finally:
-        cur.close()
-        conn.close()
+    if users is None:
+        users = get_all_users_with_status()
+    
+    for row in sorted(users, key=lambda u: u.get('email') or ''):
+        user = {
+            'id': row.get('id'),
+            'email': row.get('email'),
+            'fee_tier': row.get('fee_tier') or 'standard',
+            'total_profit': row.get('total_profit') or 0,
+            'total_trades': row.get('total_trades') or 0,
+            'agent_active': row.get('agent_status') == 'active'
+        }
+        tier = user['fee_tier']
+        if tier in result:
+            result[tier].append(user)
+        else:
+            result['standard'].append(user)
     
     return result
 
@@ -555,22 +1227,21 @@ def update_user_tier(user_id: int, new_tier: str) -> bool:
     if new_tier not in ['team', 'vip', 'standard']:
         return False
     
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
     try:
-        cur.execute(
-            "UPDATE follower_users SET fee_tier = %s WHERE id = %s",
-            (new_tier, user_id)
-        )
-        conn.commit()
-        return cur.rowcount > 0
+        with get_db() as conn, conn.cursor() as cur:
+            cur.execute(
+                "UPDATE follower_users SET fee_tier = %s WHERE id = %s",
+                (new_tier, user_id)
+            )
+            updated = cur.rowcount > 0
     except Exception as e:
-        print(f"Error updating user tier: {e}")
+        logger.error(f"Error updating user tier: {e}")
         return False
-    finally:
-        cur.close()
-        conn.close()
+    
+    # The tier panel groups the cached user list - drop it (and cached pages)
+    if updated:
+        note_dashboard_write()
+    return updated
 
 
 def cleanup_old_errors(days: int = 30) -> int:
@@ -583,281 +1254,81 @@ def cleanup_old_errors(days: int = 30) -> int:
     Returns:
         Number of errors deleted
     """
-    if not table_exists('error_logs'):
+    if not error_logs_ready():
         return 0
     
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
-        cur.execute("""
-            DELETE FROM error_logs 
-            WHERE timestamp < NOW() - INTERVAL '%s days'
-        """, (days,))
-        
-        deleted = cur.rowcount
-        conn.commit()
-        cur.close()
-        conn.close()
+        with get_db() as conn, conn.cursor() as cur:
+            cur.execute("""
+                DELETE FROM error_logs 
+                WHERE timestamp < NOW() - make_interval(days => %s)
+            """, (days,))
+            deleted = cur.rowcount
         
         if deleted > 0:
-            print(f"🧹 Cleaned up {deleted} old error logs (older than {days} days)")
+            logger.info(f"🧹 Cleaned up {deleted} old error logs (older than {days} days)")
         
         return deleted
     except Exception as e:
-        print(f"Error cleaning up old errors: {e}")
+        logger.error(f"Error cleaning up old errors: {e}")
         return 0
 
 
 def get_error_stats() -> Dict:
     """Get error statistics for monitoring"""
-    if not table_exists('error_logs'):
+    if not error_logs_ready():
         return {'total': 0, 'last_24h': 0, 'last_7d': 0, 'by_type': {}}
     
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
-        # Total errors
-        cur.execute("SELECT COUNT(*) FROM error_logs")
-        total = cur.fetchone()[0]
-        
-        # Last 24 hours
-        cur.execute("SELECT COUNT(*) FROM error_logs WHERE timestamp > NOW() - INTERVAL '24 hours'")
-        last_24h = cur.fetchone()[0]
-        
-        # Last 7 days
-        cur.execute("SELECT COUNT(*) FROM error_logs WHERE timestamp > NOW() - INTERVAL '7 days'")
-        last_7d = cur.fetchone()[0]
-        
-        # By type (top 10)
-        cur.execute("""
-            SELECT error_type, COUNT(*) as cnt 
-            FROM error_logs 
-            WHERE timestamp > NOW() - INTERVAL '7 days'
-            GROUP BY error_type 
-            ORDER BY cnt DESC 
-            LIMIT 10
-        """)
-        by_type = {row[0]: row[1] for row in cur.fetchall()}
-        
-        cur.close()
-        conn.close()
+        with get_db(readonly=True) as conn, conn.cursor() as cur:
+            # One round-trip: the 7-day window is scanned once (per-type counts
+            # with a 24h FILTER) and reused for the window totals and the top 10
+            execute_prepared(cur, """
+                WITH week AS (
+                    SELECT error_type,
+                           COUNT(*) AS cnt,
+                           COUNT(*) FILTER (WHERE timestamp > NOW() - INTERVAL '24 hours') AS cnt_24h
+                    FROM error_logs
+                    WHERE timestamp > NOW() - INTERVAL '7 days'
+                    GROUP BY error_type
+                )
+                SELECT
+                    (SELECT COUNT(*) FROM error_logs),
+                    (SELECT COALESCE(SUM(cnt_24h), 0)::bigint FROM week),
+                    (SELECT COALESCE(SUM(cnt), 0)::bigint FROM week),
+                    (SELECT COALESCE(json_agg(json_build_array(error_type, cnt) ORDER BY cnt DESC), '[]')
+                     FROM (SELECT error_type, cnt FROM week ORDER BY cnt DESC LIMIT 10) top)
+            """)
+            total, last_24h, last_7d, top_types = cur.fetchone()
         
         return {
             'total': total,
             'last_24h': last_24h,
             'last_7d': last_7d,
-            'by_type': by_type
+            'by_type': dict(top_types)
         }
     except Exception as e:
-        print(f"Error getting error stats: {e}")
+        logger.error(f"Error getting error stats: {e}")
         return {'total': 0, 'last_24h': 0, 'last_7d': 0, 'by_type': {}}
 
 
-def generate_admin_html(users: List[Dict], errors: List[Dict], stats: Dict, review_positions: List[Dict] = None, users_by_tier: Dict = None) -> str:
-    """Generate admin dashboard HTML - Dark Theme with Error Tooltips"""
-    
-    # Handle backward compatibility
-    if review_positions is None:
-        review_positions = []
-    if users_by_tier is None:
-        users_by_tier = {'team': [], 'vip': [], 'standard': []}
-    
-    # User rows
-    user_rows = ""
-    if not users:
-        user_rows = "<tr><td colspan='9' style='text-align: center; padding: 40px; color: #9ca3af;'>No users yet</td></tr>"
-    else:
-        for user in users:
-            status_class = f"status-{user['agent_status']}"
-            profit_class = "profit-positive" if user['total_profit'] >= 0 else "profit-negative"
-            profit_prefix = "+" if user['total_profit'] >= 0 else ""
-            roi_prefix = "+" if user.get('roi', 0) >= 0 else ""
-            
-            # Error indicator with tooltip
-            error_count = user.get('recent_errors', 0)
-            if error_count > 0:
-                error_cell = f'''<span class="error-indicator error-has-errors" title="⚠️ {error_count} error(s) in last 24h - see Error History below">⚠️</span>'''
-            else:
-                error_cell = '''<span class="error-indicator error-none" title="✅ No errors in last 24h">✅</span>'''
-            
-            # Fingerprint display (first 8 chars or "Not Set")
-            fingerprint = user.get('kraken_id_display', None)
-            fingerprint_cell = f'<span class="api-key" title="Full: {user.get("kraken_account_id", "")}">{fingerprint}</span>' if fingerprint else '<span style="color: #6b7280;">—</span>'
-            
-            user_rows += f"""
-            <tr>
-                <td><span class="status-badge {status_class}">{user['status_emoji']} {user['status_text']}</span></td>
-                <td style="color: #e5e7eb;">{user['email']}</td>
-                <td class="api-key">{user['api_key'][:15]}...</td>
-                <td>{fingerprint_cell}</td>
-                <td style="color: #e5e7eb;">${user.get('capital', 0):.2f}</td>
-                <td style="color: #e5e7eb;">{user['total_trades']}</td>
-                <td class="{profit_class}">{profit_prefix}${abs(user['total_profit']):.2f}</td>
-                <td class="{profit_class}">{roi_prefix}{user.get('roi', 0):.1f}%</td>
-                <td style="text-align: center;">{error_cell}</td>
-            </tr>
-            """
-    
-    # Review positions section
-    review_positions_section = ""
-    if review_positions:
-        review_rows = ""
-        for pos in review_positions:
-            side_color = "#10b981" if pos['side'].upper() in ('BUY', 'LONG') else "#ef4444"
-            review_rows += f"""
-                <tr>
-                    <td>{pos['email']}</td>
-                    <td><span style="color: {side_color}; font-weight: 600;">{pos['side']}</span> {pos['symbol']}</td>
-                    <td>{pos['quantity']:.4f} @ {pos['leverage']}x</td>
-                    <td>${pos['entry']:.2f}</td>
-                    <td><span style="color: #10b981">${pos['tp']:.2f}</span></td>
-                    <td><span style="color: #ef4444">${pos['sl']:.2f}</span></td>
-                    <td>{(pos['opened_at'] + timedelta(hours=8)).strftime('%Y-%m-%d %H:%M') + ' SGT' if pos['opened_at'] else 'N/A'}</td>
-                    <td style="color: #f59e0b;">{pos['reason']}</td>
-                    <td>
-                        <a href="#" onclick="deletePosition({pos['id']}); return false;" style="color: #ef4444; text-decoration: none;">🗑️ Delete</a>
-                    </td>
-                </tr>
-            """
-        
-        review_positions_section = f"""
-        <div class="users-section" style="border: 2px solid #f59e0b;">
-            <h2 style="color: #fbbf24;">🔍 Positions Needing Review ({len(review_positions)})</h2>
-            <p style="color: #9ca3af; margin-bottom: 15px; font-size: 13px;">
-                These positions were manually closed or had unusual closure patterns. Review and delete when confirmed.
-            </p>
-            <table>
-                <thead>
-                    <tr>
-                        <th>User</th>
-                        <th>Position</th>
-                        <th>Size</th>
-                        <th>Entry</th>
-                        <th>TP</th>
-                        <th>SL</th>
-                        <th>Opened</th>
-                        <th>Reason</th>
-                        <th>Action</th>
-                    </tr>
-                </thead>
-                <tbody>{review_rows}</tbody>
-            </table>
-        </div>
-        """
-    
-    # Error items with detailed view
-    error_items = ""
-    if not errors:
-        error_items = "<div style='text-align: center; padding: 40px; color: #9ca3af;'>No errors recorded 🎉</div>"
-    else:
-        for error in errors:
-            # Determine error severity color
-            error_type = error.get('error_type', 'unknown').lower()
-            
-            # Categorize error type (EXPANDED to catch more patterns)
-            error_type = error.get('error_type', 'unknown').lower()
-            error_msg = error.get('error_message', '').lower()
-            combined = error_type + ' ' + error_msg  # Check both for keywords
-            
-            if any(k in combined for k in ['auth', 'credential', 'decrypt', 'key_error', 'secret', 'permission', '401', 'unauthorized', 'api_key', 'invalid key']):
-                border_color = '#ef4444'  # Red - authentication
-                badge_class = 'error-badge-critical'
-                error_category = 'auth'
-            elif any(k in combined for k in ['network', 'connection', 'timeout', 'socket', 'dns', 'ssl', 'certificate', 'refused', 'unreachable']):
-                border_color = '#f59e0b'  # Orange - network
-                badge_class = 'error-badge-warning'
-                error_category = 'network'
-            elif any(k in combined for k in ['insufficient', 'balance', 'funds', 'margin', 'capital', 'deposit', 'zero_balance', 'minimum']):
-                border_color = '#8b5cf6'  # Purple - funds
-                badge_class = 'error-badge-funds'
-                error_category = 'funds'
-            elif any(k in combined for k in ['trade', 'order', 'execution', 'position', 'fill', 'market', 'limit', 'portfolio', 'init']):
-                border_color = '#3b82f6'  # Blue - trade
-                badge_class = 'error-badge-info'
-                error_category = 'trade'
-            elif any(k in combined for k in ['database', 'sql', 'table', 'column', 'relation', 'asyncpg', 'postgres', 'undefined', 'does not exist']):
-                border_color = '#ec4899'  # Pink - database
-                badge_class = 'error-badge-database'
-                error_category = 'database'
-            elif any(k in combined for k in ['module', 'import', 'attribute', 'typeerror', 'valueerror', 'keyerror', 'index', 'syntax']):
-                border_color = '#06b6d4'  # Cyan - code/system
-                badge_class = 'error-badge-code'
-                error_category = 'code'
-            elif any(k in combined for k in ['kraken', 'exchange', 'ccxt', 'api']):
-                border_color = '#f97316'  # Orange-red - exchange
-                badge_class = 'error-badge-exchange'
-                error_category = 'exchange'
-            else:
-                border_color = '#6b7280'  # Gray - other
-                badge_class = 'error-badge-info'
-                error_category = 'other'
-            
-            # Format error message
-            error_msg = error.get('error_message', '')
-            if len(error_msg) > 300:
-                error_msg = error_msg[:300] + '...'
-            
-            # HTML-escape for safe display (prevents breaking HTML parsing)
-            error_msg_escaped = html.escape(error_msg)
-            
-            # User email for display
-            user_display = error.get('email', 'Unknown User')
-            
-            # Format timestamp for Singapore timezone
-            timestamp = error.get('timestamp', '')
-            if timestamp:
-                try:
-                    timestamp_str = timestamp.strftime('%Y-%m-%d %H:%M:%S') + ' SGT'
-                except:
-                    timestamp_str = str(timestamp)
-            else:
-                timestamp_str = 'N/A'
-            
-            error_items += f"""
-            <div class="error-item" 
-                 style="border-left-color: {border_color};" 
-                 data-error-type="{error_category}"
-                 data-user="{html.escape(user_display.lower())}"
-                 data-message="{error_msg_escaped.lower()}"
-                 data-error-category="{error_type.lower()}"
-                 data-timestamp="{timestamp_str}">
-                <div class="error-header">
-                    <div style="display: flex; gap: 10px; align-items: center;">
-                        <span class="error-type {badge_class}">{error.get('error_type', 'Unknown')}</span>
-                        <span style="color: #60a5fa; font-size: 12px;">👤 {html.escape(user_display)}</span>
-                    </div>
-                    <span class="error-timestamp">{timestamp_str}</span>
-                </div>
-                <div class="error-message">{error_msg_escaped}</div>
-                <div class="error-context">API Key: {error.get('api_key', 'N/A')[:15]}...</div>
-            </div>
-            """
-    
-    profit_color = "#10b981" if stats.get('total_profit', 0) >= 0 else "#ef4444"
-    profit_prefix = "+" if stats.get('total_profit', 0) >= 0 else ""
-    roi_color = "#10b981" if stats.get('platform_roi', 0) >= 0 else "#ef4444"
-    roi_prefix = "+" if stats.get('platform_roi', 0) >= 0 else ""
-    
-    return f"""<!DOCTYPE html>
-<html>
-<head>
-    <meta charset="UTF-8">
-    <title>$NIKEPIG Admin Dashboard</title>
-    <style>
-        * {{ margin: 0; padding: 0; box-sizing: border-box; }}
-        body {{ 
+# ========== STATIC PAGE SHELL ==========
+# The stylesheet and the client-side script never change between renders, so
+# they are built once at import and iter_admin_html only formats the body.
+# The CSS is served separately (/admin/static/admin.css) so browsers cache it
+# instead of receiving it with every dashboard render.
+ADMIN_CSS = """        * { margin: 0; padding: 0; box-sizing: border-box; }
+        body { 
             font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif; 
             background: #0f1218;
             min-height: 100vh; 
             padding: 20px;
             color: #e5e7eb;
-        }}
-        .container {{ max-width: 1600px; margin: 0 auto; }}
+        }
+        .container { max-width: 1600px; margin: 0 auto; }
         
         /* Header */
-        .header {{ 
+        .header { 
             background: linear-gradient(135deg, #1e3a5f 0%, #2d1f47 100%);
             border-radius: 12px; 
             padding: 25px 30px; 
@@ -865,12 +1336,12 @@ def generate_admin_html(users: List[Dict], errors: List[Dict], stats: Dict, revi
             display: flex;
             justify-content: space-between;
             align-items: center;
-        }}
-        .header h1 {{ color: #4ade80; font-size: 28px; }}
-        .header .timestamp {{ color: #9ca3af; font-size: 14px; margin-top: 5px; }}
+        }
+        .header h1 { color: #4ade80; font-size: 28px; }
+        .header .timestamp { color: #9ca3af; font-size: 14px; margin-top: 5px; }
         
         /* Tactile Refresh Button */
-        .refresh-btn {{
+        .refresh-btn {
             background: linear-gradient(135deg, #10b981 0%, #059669 100%);
             color: white;
             border: none;
@@ -885,62 +1356,62 @@ def generate_admin_html(users: List[Dict], errors: List[Dict], stats: Dict, revi
             transition: all 0.1s ease;
             transform: translateY(0);
             box-shadow: 0 4px 6px rgba(0, 0, 0, 0.3), 0 2px 4px rgba(16, 185, 129, 0.2);
-        }}
-        .refresh-btn:hover {{
+        }
+        .refresh-btn:hover {
             background: linear-gradient(135deg, #34d399 0%, #10b981 100%);
             transform: translateY(-2px);
             box-shadow: 0 6px 12px rgba(0, 0, 0, 0.4), 0 4px 8px rgba(16, 185, 129, 0.3);
-        }}
-        .refresh-btn:active {{
+        }
+        .refresh-btn:active {
             transform: translateY(2px);
             box-shadow: 0 2px 4px rgba(0, 0, 0, 0.3);
-        }}
+        }
         
         /* Stats Grid */
-        .stats-grid {{ 
+        .stats-grid { 
             display: grid; 
             grid-template-columns: repeat(auto-fit, minmax(150px, 1fr)); 
             gap: 15px; 
             margin-bottom: 20px; 
-        }}
-        .stat-card {{ 
+        }
+        .stat-card { 
             background: #1a1f2e;
             border-radius: 12px; 
             padding: 20px; 
             border: 1px solid #2d3748;
-        }}
-        .stat-label {{ 
+        }
+        .stat-label { 
             color: #9ca3af; 
             font-size: 11px; 
             margin-bottom: 8px; 
             text-transform: uppercase;
             letter-spacing: 0.5px;
-        }}
-        .stat-value {{ font-size: 32px; font-weight: bold; }}
-        .stat-sub {{ color: #6b7280; font-size: 11px; margin-top: 4px; }}
+        }
+        .stat-value { font-size: 32px; font-weight: bold; }
+        .stat-sub { color: #6b7280; font-size: 11px; margin-top: 4px; }
         
         /* Tax Reports Section */
-        .tax-reports-section {{
+        .tax-reports-section {
             background: linear-gradient(135deg, #1a3a1f 0%, #1a1f2e 100%);
             border-radius: 12px;
             padding: 25px;
             margin-bottom: 20px;
             border: 2px solid #10b981;
-        }}
-        .tax-reports-section h2 {{
+        }
+        .tax-reports-section h2 {
             color: #10b981;
             margin-bottom: 20px;
             display: flex;
             align-items: center;
             gap: 10px;
-        }}
-        .report-controls {{
+        }
+        .report-controls {
             display: flex;
             gap: 15px;
             flex-wrap: wrap;
             margin-bottom: 20px;
-        }}
-        .report-select {{
+        }
+        .report-select {
             padding: 12px 16px;
             background: #1f2937;
             border: 1px solid #374151;
@@ -949,12 +1420,12 @@ def generate_admin_html(users: List[Dict], errors: List[Dict], stats: Dict, revi
             font-size: 14px;
             cursor: pointer;
             min-width: 150px;
-        }}
-        .report-select:focus {{
+        }
+        .report-select:focus {
             outline: none;
             border-color: #10b981;
-        }}
-        .download-btn {{
+        }
+        .download-btn {
             padding: 12px 24px;
             background: linear-gradient(135deg, #10b981 0%, #059669 100%);
             border: none;
@@ -967,51 +1438,51 @@ def generate_admin_html(users: List[Dict], errors: List[Dict], stats: Dict, revi
             display: flex;
             align-items: center;
             gap: 8px;
-        }}
-        .download-btn:hover {{
+        }
+        .download-btn:hover {
             background: linear-gradient(135deg, #34d399 0%, #10b981 100%);
             transform: translateY(-2px);
             box-shadow: 0 4px 8px rgba(16, 185, 129, 0.3);
-        }}
-        .download-btn:active {{
+        }
+        .download-btn:active {
             transform: translateY(0);
-        }}
-        .income-summary {{
+        }
+        .income-summary {
             display: grid;
             grid-template-columns: repeat(auto-fit, minmax(200px, 1fr));
             gap: 15px;
             margin-top: 20px;
-        }}
-        .income-card {{
+        }
+        .income-card {
             background: #0f1218;
             padding: 20px;
             border-radius: 8px;
             border: 1px solid #374151;
-        }}
-        .income-label {{
+        }
+        .income-label {
             color: #9ca3af;
             font-size: 12px;
             text-transform: uppercase;
             letter-spacing: 0.5px;
             margin-bottom: 8px;
-        }}
-        .income-value {{
+        }
+        .income-value {
             color: #10b981;
             font-size: 24px;
             font-weight: bold;
-        }}
+        }
         
         /* Users Section */
-        .users-section {{ 
+        .users-section { 
             background: #1a1f2e;
             border-radius: 12px; 
             padding: 20px; 
             margin-bottom: 20px;
             border: 1px solid #2d3748;
-        }}
-        .users-section h2 {{ color: #e5e7eb; margin-bottom: 15px; }}
-        table {{ width: 100%; border-collapse: collapse; }}
-        th {{ 
+        }
+        .users-section h2 { color: #e5e7eb; margin-bottom: 15px; }
+        table { width: 100%; border-collapse: collapse; }
+        th { 
             background: #0f1218;
             padding: 12px; 
             text-align: left; 
@@ -1020,84 +1491,84 @@ def generate_admin_html(users: List[Dict], errors: List[Dict], stats: Dict, revi
             font-size: 11px;
             text-transform: uppercase;
             letter-spacing: 0.5px;
-        }}
-        td {{ padding: 12px; border-bottom: 1px solid #2d3748; }}
-        .api-key {{ color: #6b7280; font-family: monospace; font-size: 12px; }}
+        }
+        td { padding: 12px; border-bottom: 1px solid #2d3748; }
+        .api-key { color: #6b7280; font-family: monospace; font-size: 12px; }
         
         /* Status Badges */
-        .status-badge {{ 
+        .status-badge { 
             display: inline-block; 
             padding: 4px 12px; 
             border-radius: 12px; 
             font-size: 12px; 
             font-weight: 600; 
-        }}
-        .status-active {{ background: #064e3b; color: #34d399; }}
-        .status-pending, .status-configured {{ background: #1e3a5f; color: #60a5fa; }}
-        .status-inactive {{ background: #374151; color: #9ca3af; }}
-        .status-error {{ background: #7f1d1d; color: #fca5a5; }}
+        }
+        .status-active { background: #064e3b; color: #34d399; }
+        .status-pending, .status-configured { background: #1e3a5f; color: #60a5fa; }
+        .status-inactive { background: #374151; color: #9ca3af; }
+        .status-error { background: #7f1d1d; color: #fca5a5; }
         
         /* Profit Colors */
-        .profit-positive {{ color: #10b981; font-weight: 600; }}
-        .profit-negative {{ color: #ef4444; font-weight: 600; }}
+        .profit-positive { color: #10b981; font-weight: 600; }
+        .profit-negative { color: #ef4444; font-weight: 600; }
         
         /* Error Indicators */
-        .error-indicator {{
+        .error-indicator {
             font-size: 16px;
             cursor: help;
             transition: transform 0.2s;
-        }}
-        .error-indicator:hover {{
+        }
+        .error-indicator:hover {
             transform: scale(1.3);
-        }}
+        }
         
         /* Errors Section */
-        .errors-section {{ 
+        .errors-section { 
             background: #1a1f2e;
             border-radius: 12px; 
             padding: 20px;
             border: 1px solid #2d3748;
-        }}
-        .errors-header {{
+        }
+        .errors-header {
             display: flex;
             justify-content: space-between;
             align-items: center;
             margin-bottom: 15px;
-        }}
-        .errors-section h2 {{ color: #fbbf24; }}
+        }
+        .errors-section h2 { color: #fbbf24; }
         
         /* Error Legend */
-        .error-legend {{
+        .error-legend {
             display: flex;
             gap: 15px;
             font-size: 11px;
-        }}
-        .legend-item {{
+        }
+        .legend-item {
             display: flex;
             align-items: center;
             gap: 5px;
-        }}
-        .legend-dot {{
+        }
+        .legend-dot {
             width: 10px;
             height: 10px;
             border-radius: 50%;
-        }}
-        .legend-dot.critical {{ background: #ef4444; }}
-        .legend-dot.warning {{ background: #f59e0b; }}
-        .legend-dot.funds {{ background: #8b5cf6; }}
-        .legend-dot.database {{ background: #ec4899; }}
-        .legend-dot.code {{ background: #06b6d4; }}
-        .legend-dot.exchange {{ background: #f97316; }}
-        .legend-dot.info {{ background: #6b7280; }}
+        }
+        .legend-dot.critical { background: #ef4444; }
+        .legend-dot.warning { background: #f59e0b; }
+        .legend-dot.funds { background: #8b5cf6; }
+        .legend-dot.database { background: #ec4899; }
+        .legend-dot.code { background: #06b6d4; }
+        .legend-dot.exchange { background: #f97316; }
+        .legend-dot.info { background: #6b7280; }
         
         /* Search Box */
-        .search-box {{
+        .search-box {
             margin-bottom: 20px;
             display: flex;
             gap: 10px;
             align-items: center;
-        }}
-        .search-input {{
+        }
+        .search-input {
             flex: 1;
             padding: 12px 16px;
             background: #1f2937;
@@ -1105,15 +1576,15 @@ def generate_admin_html(users: List[Dict], errors: List[Dict], stats: Dict, revi
             border-radius: 8px;
             color: #e5e7eb;
             font-size: 14px;
-        }}
-        .search-input:focus {{
+        }
+        .search-input:focus {
             outline: none;
             border-color: #10b981;
-        }}
-        .search-input::placeholder {{
+        }
+        .search-input::placeholder {
             color: #6b7280;
-        }}
-        .filter-select {{
+        }
+        .filter-select {
             padding: 12px 16px;
             background: #1f2937;
             border: 1px solid #374151;
@@ -1122,12 +1593,12 @@ def generate_admin_html(users: List[Dict], errors: List[Dict], stats: Dict, revi
             font-size: 14px;
             cursor: pointer;
             min-width: 180px;
-        }}
-        .filter-select:focus {{
+        }
+        .filter-select:focus {
             outline: none;
             border-color: #10b981;
-        }}
-        .clear-search {{
+        }
+        .clear-search {
             padding: 12px 20px;
             background: #374151;
             border: none;
@@ -1136,21 +1607,21 @@ def generate_admin_html(users: List[Dict], errors: List[Dict], stats: Dict, revi
             cursor: pointer;
             font-size: 14px;
             transition: background 0.2s;
-        }}
-        .clear-search:hover {{
+        }
+        .clear-search:hover {
             background: #4b5563;
-        }}
+        }
         
         /* Pagination */
-        .pagination {{
+        .pagination {
             display: flex;
             justify-content: center;
             align-items: center;
             gap: 10px;
             margin-top: 20px;
             padding: 20px;
-        }}
-        .page-btn {{
+        }
+        .page-btn {
             padding: 8px 16px;
             background: #374151;
             border: 1px solid #4b5563;
@@ -1159,67 +1630,67 @@ def generate_admin_html(users: List[Dict], errors: List[Dict], stats: Dict, revi
             cursor: pointer;
             font-size: 14px;
             transition: all 0.2s;
-        }}
-        .page-btn:hover {{
+        }
+        .page-btn:hover {
             background: #4b5563;
             border-color: #10b981;
-        }}
-        .page-btn:disabled {{
+        }
+        .page-btn:disabled {
             opacity: 0.5;
             cursor: not-allowed;
-        }}
-        .page-btn.active {{
+        }
+        .page-btn.active {
             background: #10b981;
             border-color: #10b981;
             font-weight: 600;
-        }}
-        .page-info {{
+        }
+        .page-info {
             color: #9ca3af;
             font-size: 14px;
-        }}
+        }
         
         /* Hidden class for filtering */
-        .hidden {{ display: none !important; }}
+        .hidden { display: none !important; }
         
         /* Tax Reports Section */
-        .tax-section {{
+        .tax-section {
             background: linear-gradient(135deg, #1e3a5f 0%, #1a2332 100%);
             border-radius: 12px;
             padding: 25px;
             margin-bottom: 20px;
             border: 2px solid #10b981;
-        }}
-        .tax-section h2 {{
+        }
+        .tax-section h2 {
             color: #10b981;
             margin-bottom: 20px;
             display: flex;
             align-items: center;
             gap: 10px;
-        }}
-        .tax-controls {{
+        }
+        .tax-controls {
             display: grid;
             grid-template-columns: repeat(auto-fit, minmax(200px, 1fr));
             gap: 15px;
             margin-bottom: 20px;
-        }}
-        .tax-input {{
+        }
+        .tax-input {
             padding: 12px;
             background: #1f2937;
             border: 1px solid #374151;
             border-radius: 8px;
             color: #e5e7eb;
             font-size: 14px;
-        }}
-        .tax-input:focus {{
+        }
+        .tax-input:focus {
             outline: none;
             border-color: #10b981;
-        }}
-        .export-grid {{
+        }
+        .export-grid {
             display: grid;
             grid-template-columns: repeat(auto-fit, minmax(200px, 1fr));
             gap: 12px;
-        }}
-        .export-btn {{
+        }
+        .export-btn {
             padding: 14px 20px;
             background: linear-gradient(135deg, #10b981 0%, #059669 100%);
             color: white;
@@ -1233,121 +1704,121 @@ def generate_admin_html(users: List[Dict], errors: List[Dict], stats: Dict, revi
             align-items: center;
             justify-content: center;
             gap: 8px;
-        }}
-        .export-btn:hover {{
+        }
+        .export-btn:hover {
             transform: translateY(-2px);
             box-shadow: 0 6px 12px rgba(16, 185, 129, 0.3);
-        }}
-        .export-btn:active {{
+        }
+        .export-btn:active {
             transform: translateY(0);
-        }}
-        .tax-summary {{
+        }
+        .tax-summary {
             display: grid;
             grid-template-columns: repeat(auto-fit, minmax(150px, 1fr));
             gap: 15px;
             margin-top: 20px;
             padding-top: 20px;
             border-top: 1px solid #374151;
-        }}
-        .tax-stat {{
+        }
+        .tax-stat {
             text-align: center;
-        }}
-        .tax-stat-label {{
+        }
+        .tax-stat-label {
             color: #9ca3af;
             font-size: 12px;
             margin-bottom: 5px;
-        }}
-        .tax-stat-value {{
+        }
+        .tax-stat-value {
             color: #10b981;
             font-size: 24px;
             font-weight: bold;
-        }}
+        }
         
         /* Error Items */
-        .error-item {{ 
+        .error-item { 
             border-left: 4px solid #ef4444; 
             background: #1f2937;
             padding: 15px; 
             margin-bottom: 12px; 
             border-radius: 0 8px 8px 0;
-        }}
-        .error-header {{
+        }
+        .error-header {
             display: flex;
             justify-content: space-between;
             margin-bottom: 8px;
-        }}
-        .error-type {{ 
+        }
+        .error-type { 
             font-weight: 600; 
             padding: 2px 8px;
             border-radius: 4px;
             font-size: 12px;
-        }}
-        .error-badge-critical {{ background: #7f1d1d; color: #fca5a5; }}
-        .error-badge-warning {{ background: #78350f; color: #fcd34d; }}
-        .error-badge-funds {{ background: #4c1d95; color: #c4b5fd; }}
-        .error-badge-info {{ background: #374151; color: #9ca3af; }}
-        .error-badge-database {{ background: #831843; color: #f9a8d4; }}
-        .error-badge-code {{ background: #164e63; color: #67e8f9; }}
-        .error-badge-exchange {{ background: #7c2d12; color: #fdba74; }}
-        .error-timestamp {{ color: #6b7280; font-size: 12px; }}
-        .error-message {{ color: #e5e7eb; font-size: 13px; line-height: 1.5; }}
-        .error-context {{ color: #6b7280; font-size: 11px; margin-top: 8px; font-family: monospace; }}
+        }
+        .error-badge-critical { background: #7f1d1d; color: #fca5a5; }
+        .error-badge-warning { background: #78350f; color: #fcd34d; }
+        .error-badge-funds { background: #4c1d95; color: #c4b5fd; }
+        .error-badge-info { background: #374151; color: #9ca3af; }
+        .error-badge-database { background: #831843; color: #f9a8d4; }
+        .error-badge-code { background: #164e63; color: #67e8f9; }
+        .error-badge-exchange { background: #7c2d12; color: #fdba74; }
+        .error-timestamp { color: #6b7280; font-size: 12px; }
+        .error-message { color: #e5e7eb; font-size: 13px; line-height: 1.5; }
+        .error-context { color: #6b7280; font-size: 11px; margin-top: 8px; font-family: monospace; }
         
         /* User Tiers Section */
-        .tiers-section {{
+        .tiers-section {
             background: #1a1f2e;
             border-radius: 12px;
             padding: 25px;
             margin-bottom: 20px;
             border: 1px solid #2d3748;
-        }}
-        .tiers-section h2 {{
+        }
+        .tiers-section h2 {
             color: #e5e7eb;
             margin-bottom: 20px;
-        }}
-        .tiers-grid {{
+        }
+        .tiers-grid {
             display: grid;
             grid-template-columns: repeat(3, 1fr);
             gap: 20px;
-        }}
-        .tier-column {{
+        }
+        .tier-column {
             background: #111827;
             border-radius: 10px;
             padding: 15px;
             min-height: 200px;
-        }}
-        .tier-column.team {{
+        }
+        .tier-column.team {
             border: 2px solid #10b981;
-        }}
-        .tier-column.vip {{
+        }
+        .tier-column.vip {
             border: 2px solid #f59e0b;
-        }}
-        .tier-column.standard {{
+        }
+        .tier-column.standard {
             border: 2px solid #6b7280;
-        }}
-        .tier-header {{
+        }
+        .tier-header {
             display: flex;
             justify-content: space-between;
             align-items: center;
             margin-bottom: 15px;
             padding-bottom: 10px;
             border-bottom: 1px solid #374151;
-        }}
-        .tier-header h3 {{
+        }
+        .tier-header h3 {
             margin: 0;
             font-size: 16px;
-        }}
-        .tier-header.team h3 {{ color: #10b981; }}
-        .tier-header.vip h3 {{ color: #f59e0b; }}
-        .tier-header.standard h3 {{ color: #9ca3af; }}
-        .tier-count {{
+        }
+        .tier-header.team h3 { color: #10b981; }
+        .tier-header.vip h3 { color: #f59e0b; }
+        .tier-header.standard h3 { color: #9ca3af; }
+        .tier-count {
             background: #374151;
             padding: 3px 10px;
             border-radius: 12px;
             font-size: 12px;
             color: #e5e7eb;
-        }}
-        .tier-user {{
+        }
+        .tier-user {
             display: flex;
             justify-content: space-between;
             align-items: center;
@@ -1356,116 +1827,84 @@ def generate_admin_html(users: List[Dict], errors: List[Dict], stats: Dict, revi
             border-radius: 6px;
             margin-bottom: 8px;
             font-size: 13px;
-        }}
-        .tier-user:hover {{
+        }
+        .tier-user:hover {
             background: #2d3748;
-        }}
-        .tier-user-email {{
+        }
+        .tier-user-email {
             color: #e5e7eb;
             flex: 1;
             overflow: hidden;
             text-overflow: ellipsis;
             white-space: nowrap;
-        }}
-        .tier-user-stats {{
+        }
+        .tier-user-stats {
             color: #6b7280;
             font-size: 11px;
             margin-left: 10px;
-        }}
-        .tier-user-actions {{
+        }
+        .tier-user-actions {
             display: flex;
             gap: 5px;
             margin-left: 10px;
-        }}
-        .tier-btn {{
+        }
+        .tier-btn {
             padding: 3px 8px;
             border-radius: 4px;
             border: none;
             cursor: pointer;
             font-size: 11px;
             transition: all 0.2s;
-        }}
-        .tier-btn.to-team {{
+        }
+        .tier-btn.to-team {
             background: #065f46;
             color: #10b981;
-        }}
-        .tier-btn.to-team:hover {{
+        }
+        .tier-btn.to-team:hover {
             background: #10b981;
             color: white;
-        }}
-        .tier-btn.to-vip {{
+        }
+        .tier-btn.to-vip {
             background: #78350f;
             color: #f59e0b;
-        }}
-        .tier-btn.to-vip:hover {{
+        }
+        .tier-btn.to-vip:hover {
             background: #f59e0b;
             color: white;
-        }}
-        .tier-btn.to-standard {{
+        }
+        .tier-btn.to-standard {
             background: #374151;
             color: #9ca3af;
-        }}
-        .tier-btn.to-standard:hover {{
+        }
+        .tier-btn.to-standard:hover {
             background: #6b7280;
             color: white;
-        }}
-        .tier-empty {{
+        }
+        .tier-empty {
             color: #6b7280;
             text-align: center;
             padding: 30px;
             font-style: italic;
-        }}
-    </style>
+        }
+"""
+
+# Content hash for the stylesheet URL: a deploy that changes the CSS changes
+# the URL, so the far-future Cache-Control on it is safe
+ADMIN_CSS_VERSION = hashlib.sha1(ADMIN_CSS.encode()).hexdigest()[:12]
+
+_ADMIN_HTML_HEAD = f"""<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="UTF-8">
+    <title>$NIKEPIG Admin Dashboard</title>
+    <link rel="stylesheet" href="/admin/static/admin.css?v={ADMIN_CSS_VERSION}">
 </head>
 <body>
-    <div class="container">
-        <div class="header">
-            <div>
-                <h1>🚀 $NIKEPIG Admin Dashboard</h1>
-                <div class="timestamp">{(datetime.utcnow() + timedelta(hours=8)).strftime('%Y-%m-%d %H:%M:%S')} SGT (GMT+8)</div>
-            </div>
-            <button class="refresh-btn" onclick="location.reload()">
-                🔄 Refresh
-            </button>
-        </div>
-        
-        <div class="stats-grid">
-            <div class="stat-card">
-                <div class="stat-label">Total Users</div>
-                <div class="stat-value" style="color: #e5e7eb;">{stats.get('total_users', 0)}</div>
-                <div class="stat-sub">{stats.get('configured_users', 0)} configured</div>
-            </div>
-            <div class="stat-card">
-                <div class="stat-label">Active Now</div>
-                <div class="stat-value" style="color: #10b981;">{stats.get('active_now', 0)}</div>
-                <div class="stat-sub">{stats.get('active_percent', 0):.1f}% of configured</div>
-            </div>
-            <div class="stat-card">
-                <div class="stat-label">Total Trades</div>
-                <div class="stat-value" style="color: #e5e7eb;">{stats.get('total_trades', 0)}</div>
-            </div>
-            <div class="stat-card">
-                <div class="stat-label">Total Profit</div>
-                <div class="stat-value" style="color: {profit_color};">{profit_prefix}${abs(stats.get('total_profit', 0)):.2f}</div>
-                <div class="stat-sub">${stats.get('avg_profit', 0):.2f} avg/user</div>
-            </div>
-            <div class="stat-card">
-                <div class="stat-label">Platform Capital</div>
-                <div class="stat-value" style="color: #e5e7eb;">${stats.get('platform_capital', 0):,.0f}</div>
-            </div>
-            <div class="stat-card">
-                <div class="stat-label">Current Value</div>
-                <div class="stat-value" style="color: #e5e7eb;">${stats.get('current_value', 0):,.0f}</div>
-            </div>
-            <div class="stat-card">
-                <div class="stat-label">Platform ROI</div>
-                <div class="stat-value" style="color: {roi_color};">{roi_prefix}{stats.get('platform_roi', 0):.1f}%</div>
-            </div>
-            <div class="stat-card">
-                <div class="stat-label">Errors (1H)</div>
-                <div class="stat-value" style="color: {'#ef4444' if stats.get('errors_1h', 0) > 0 else '#10b981'};">{stats.get('errors_1h', 0)}</div>
-            </div>
-        </div>
+"""
+
+# Static body sections (no per-render values); yielded as-is around the
+# dynamic parts
+_TAX_REPORTS_SECTION = """
         
         <div class="tax-reports-section">
             <h2>💰 Tax & Income Reports</h2>
@@ -1512,105 +1951,9 @@ def generate_admin_html(users: List[Dict], errors: List[Dict], stats: Dict, revi
             </div>
         </div>
         
-        <!-- User Fee Tiers Section -->
-        <div class="tiers-section">
-            <h2>💰 User Fee Tiers</h2>
-            <div class="tiers-grid">
-                <!-- Team Column (0%) -->
-                <div class="tier-column team">
-                    <div class="tier-header team">
-                        <h3>🏠 Team (0%)</h3>
-                        <span class="tier-count">{len(users_by_tier.get('team', []))} users</span>
-                    </div>
-                    <div class="tier-users" id="tier-team">
-                        {''.join([f'''
-                        <div class="tier-user" data-user-id="{u['id']}">
-                            <span class="tier-user-email" title="{u['email']}">{u['email']}</span>
-                            <span class="tier-user-stats">${u['total_profit']:.0f}</span>
-                            <div class="tier-user-actions">
-                                <button class="tier-btn to-vip" onclick="changeTier({u['id']}, 'vip')" title="Move to VIP">⭐</button>
-                                <button class="tier-btn to-standard" onclick="changeTier({u['id']}, 'standard')" title="Move to Standard">👤</button>
-                            </div>
-                        </div>
-                        ''' for u in users_by_tier.get('team', [])]) or '<div class="tier-empty">No team members</div>'}
-                    </div>
-                </div>
-                
-                <!-- VIP Column (5%) -->
-                <div class="tier-column vip">
-                    <div class="tier-header vip">
-                        <h3>⭐ VIP (5%)</h3>
-                        <span class="tier-count">{len(users_by_tier.get('vip', []))} users</span>
-                    </div>
-                    <div class="tier-users" id="tier-vip">
-                        {''.join([f'''
-                        <div class="tier-user" data-user-id="{u['id']}">
-                            <span class="tier-user-email" title="{u['email']}">{u['email']}</span>
-                            <span class="tier-user-stats">${u['total_profit']:.0f}</span>
-                            <div class="tier-user-actions">
-                                <button class="tier-btn to-team" onclick="changeTier({u['id']}, 'team')" title="Move to Team">🏠</button>
-                                <button class="tier-btn to-standard" onclick="changeTier({u['id']}, 'standard')" title="Move to Standard">👤</button>
-                            </div>
-                        </div>
-                        ''' for u in users_by_tier.get('vip', [])]) or '<div class="tier-empty">No VIP users</div>'}
-                    </div>
-                </div>
-                
-                <!-- Standard Column (10%) -->
-                <div class="tier-column standard">
-                    <div class="tier-header standard">
-                        <h3>👤 Standard (10%)</h3>
-                        <span class="tier-count">{len(users_by_tier.get('standard', []))} users</span>
-                    </div>
-                    <div class="tier-users" id="tier-standard">
-                        {''.join([f'''
-                        <div class="tier-user" data-user-id="{u['id']}">
-                            <span class="tier-user-email" title="{u['email']}">{u['email']}</span>
-                            <span class="tier-user-stats">${u['total_profit']:.0f}</span>
-                            <div class="tier-user-actions">
-                                <button class="tier-btn to-team" onclick="changeTier({u['id']}, 'team')" title="Move to Team">🏠</button>
-                                <button class="tier-btn to-vip" onclick="changeTier({u['id']}, 'vip')" title="Move to VIP">⭐</button>
-                            </div>
-                        </div>
-                        ''' for u in users_by_tier.get('standard', [])]) or '<div class="tier-empty">No standard users</div>'}
-                    </div>
-                </div>
-            </div>
-        </div>
-        
-        <div class="users-section">
-            <h2>👥 Users ({stats.get('total_users', 0)})</h2>
-            <div class="search-box">
-                <input 
-                    type="text" 
-                    id="userSearch" 
-                    class="search-input" 
-                    placeholder="🔍 Search by email or API key..."
-                    onkeyup="filterUsers()"
-                />
-                <button class="clear-search" onclick="clearSearch()">Clear</button>
-            </div>
-            <table id="usersTable">
-                <thead>
-                    <tr>
-                        <th>Status</th>
-                        <th>Email</th>
-                        <th>API Key</th>
-                        <th>Fingerprint</th>
-                        <th>Capital</th>
-                        <th>Trades</th>
-                        <th>Profit</th>
-                        <th>ROI</th>
-                        <th>Errors</th>
-                    </tr>
-                </thead>
-                <tbody>{user_rows}</tbody>
-            </table>
-        </div>
-        
-        {review_positions_section}
-        
-        <div class="errors-section">
+"""
+
+_ERRORS_SECTION_HEAD = """        <div class="errors-section">
             <div class="errors-header">
                 <h2>⚠️ Error History (SGT / GMT+8)</h2>
                 <div class="error-legend">
@@ -1649,14 +1992,18 @@ def generate_admin_html(users: List[Dict], errors: List[Dict], stats: Dict, revi
                     <option value="other">⚪ Other</option>
                 </select>
                 <button class="clear-search" onclick="clearErrorFilters()">Clear</button>
+                <button class="clear-search" onclick="downloadErrorLogCSV()">📥 Export CSV</button>
             </div>
             <div id="errorCount" style="color: #9ca3af; font-size: 13px; margin-bottom: 15px;"></div>
-            {error_items}
-            <div class="pagination" id="errorPagination"></div>
-        </div>
-    </div>
+            <div id="errorItems">"""
+
+# The only per-render value in the script is the user count, spliced in as a
+# top-level variable (refreshDashboard updates it in place)
+_ADMIN_SCRIPT_HEAD = """    <script>
+    let totalUsers = """
+
+_ADMIN_SCRIPT_TAIL = f""";
     
-    <script>
     // ============ DYNAMIC YEAR POPULATION ============
     async function populateYears() {{
         const yearSelect = document.getElementById('reportYear');
@@ -1734,6 +2081,10 @@ def generate_admin_html(users: List[Dict], errors: List[Dict], stats: Dict, revi
         window.location.href = url;
     }}
     
+    function downloadErrorLogCSV() {{
+        window.location.href = `/admin/errors/export-csv?password=${{ADMIN_PASSWORD}}`;
+    }}
+    
     function downloadUserFeesCSV() {{
         const year = document.getElementById('reportYear').value;
         const startDate = `${{year}}-01-01`;
@@ -1817,7 +2168,6 @@ def generate_admin_html(users: List[Dict], errors: List[Dict], stats: Dict, revi
         
         // Update visible count
         const header = document.querySelector('.users-section h2');
-        const totalUsers = {stats.get('total_users', 0)};
         if (searchInput) {{
             header.textContent = `👥 Users (${{visibleCount}} of ${{totalUsers}})`;
         }} else {{
@@ -2059,6 +2409,567 @@ def generate_admin_html(users: List[Dict], errors: List[Dict], stats: Dict, revi
             }});
         }}
     }}
-    </script>
-</body>
+    // ============ OLDER ERRORS ============
+    // The page ships the newest errors; older pages are fetched by id on demand
+    // and appended, so a long error history is never rendered up front.
+    function setOlderErrorsCursor(beforeId) {{
+        document.getElementById('loadOlderErrorsBtn').dataset.beforeId = beforeId || '';
+        document.getElementById('olderErrors').style.display = beforeId ? '' : 'none';
+    }}
+    
+    async function loadOlderErrors() {{
+        const btn = document.getElementById('loadOlderErrorsBtn');
+        btn.disabled = true;
+        try {{
+            const response = await fetch(`/admin/errors.json?password=${{encodeURIComponent(ADMIN_PASSWORD)}}&before_id=${{btn.dataset.beforeId}}`);
+            if (!response.ok) throw new Error(`HTTP ${{response.status}}`);
+            const data = await response.json();
+            
+            document.getElementById('errorItems').insertAdjacentHTML('beforeend', data.error_items_html);
+            setOlderErrorsCursor(data.before_id);
+            
+            // Apply active filters to the new items, staying on the current page
+            const page = currentPage;
+            filterErrors();
+            currentPage = page;
+            paginateErrors();
+        }} catch (err) {{
+            console.error('Loading older errors failed:', err);
+        }} finally {{
+            btn.disabled = false;
+        }}
+    }}
+    
+    // ============ IN-PLACE REFRESH ============
+    // Fetches stats + rows as JSON and patches the page instead of reloading it.
+    // The browser revalidates with If-None-Match, so an idle dashboard costs a 304.
+    async function refreshDashboard() {{
+        const btn = document.querySelector('.refresh-btn');
+        btn.disabled = true;
+        try {{
+            const response = await fetch(`/admin/data.json?password=${{encodeURIComponent(ADMIN_PASSWORD)}}`, {{ cache: 'no-cache' }});
+            if (!response.ok) throw new Error(`HTTP ${{response.status}}`);
+            const data = await response.json();
+            
+            document.getElementById('dashboardTimestamp').textContent = data.timestamp;
+            document.getElementById('statsGrid').outerHTML = data.stats_html;
+            document.getElementById('usersBody').innerHTML = data.user_rows_html;
+            document.getElementById('errorItems').innerHTML = data.error_items_html;
+            setOlderErrorsCursor(data.errors_before_id);
+            totalUsers = data.total_users;
+            
+            // Re-apply any active search/filters to the new rows
+            filterUsers();
+            filterErrors();
+        }} catch (err) {{
+            console.error('Refresh failed, reloading page:', err);
+            location.reload();
+        }} finally {{
+            btn.disabled = false;
+        }}
+    }}
+    
+    </script>
+</body>
 </html>"""
+
+
+# Per-row markup, parsed once at import and filled with str.format_map
+_USER_ROW_TEMPLATE = """
+            <tr>
+                <td><span class="status-badge status-{agent_status}">{status_emoji} {status_text}</span></td>
+                <td style="color: #e5e7eb;">{email}</td>
+                <td class="api-key">{api_key_short}...</td>
+                <td>{fingerprint_cell}</td>
+                <td style="color: #e5e7eb;">${capital:.2f}</td>
+                <td style="color: #e5e7eb;">{total_trades}</td>
+                <td class="{profit_class}">{profit_prefix}${profit_abs:.2f}</td>
+                <td class="{profit_class}">{roi_prefix}{roi:.1f}%</td>
+                <td style="text-align: center;">{error_cell}</td>
+            </tr>
+            """
+
+_ERROR_ITEM_TEMPLATE = """
+            <div class="error-item" 
+                 style="border-left-color: {border_color};" 
+                 data-error-type="{error_category}"
+                 data-user="{user_attr}"
+                 data-message="{message_attr}"
+                 data-error-category="{type_attr}"
+                 data-timestamp="{timestamp_str}">
+                <div class="error-header">
+                    <div style="display: flex; gap: 10px; align-items: center;">
+                        <span class="error-type {badge_class}">{error_type}</span>
+                        <span style="color: #60a5fa; font-size: 12px;">👤 {user_display}</span>
+                    </div>
+                    <span class="error-timestamp">{timestamp_str}</span>
+                </div>
+                <div class="error-message">{error_msg}</div>
+                <div class="error-context">API Key: {api_key_short}...</div>
+            </div>
+            """
+
+# Error categorization: first keyword match (in type + message) wins
+_ERROR_CATEGORIES = (
+    ('auth', '#ef4444', 'error-badge-critical',  # Red - authentication
+     ('auth', 'credential', 'decrypt', 'key_error', 'secret', 'permission', '401', 'unauthorized', 'api_key', 'invalid key')),
+    ('network', '#f59e0b', 'error-badge-warning',  # Orange - network
+     ('network', 'connection', 'timeout', 'socket', 'dns', 'ssl', 'certificate', 'refused', 'unreachable')),
+    ('funds', '#8b5cf6', 'error-badge-funds',  # Purple - funds
+     ('insufficient', 'balance', 'funds', 'margin', 'capital', 'deposit', 'zero_balance', 'minimum')),
+    ('trade', '#3b82f6', 'error-badge-info',  # Blue - trade
+     ('trade', 'order', 'execution', 'position', 'fill', 'market', 'limit', 'portfolio', 'init')),
+    ('database', '#ec4899', 'error-badge-database',  # Pink - database
+     ('database', 'sql', 'table', 'column', 'relation', 'asyncpg', 'postgres', 'undefined', 'does not exist')),
+    ('code', '#06b6d4', 'error-badge-code',  # Cyan - code/system
+     ('module', 'import', 'attribute', 'typeerror', 'valueerror', 'keyerror', 'index', 'syntax')),
+    ('exchange', '#f97316', 'error-badge-exchange',  # Orange-red - exchange
+     ('kraken', 'exchange', 'ccxt', 'api')),
+)
+_OTHER_ERROR_CATEGORY = ('other', '#6b7280', 'error-badge-info')  # Gray - other
+
+# category -> (category, border color, badge class)
+_ERROR_CATEGORY_STYLES = {entry[0]: entry[:3] for entry in _ERROR_CATEGORIES}
+_ERROR_CATEGORY_STYLES[_OTHER_ERROR_CATEGORY[0]] = _OTHER_ERROR_CATEGORY
+
+# The same first-match rules as a SQL CASE over a lower-cased
+# "type message" string, so get_recent_errors rows arrive categorized.
+# strpos, not LIKE: keywords such as 'key_error' contain LIKE wildcards.
+_ERROR_CATEGORY_SQL = "CASE\n" + "\n".join(
+    f"    WHEN {' OR '.join(f'strpos(haystack, {k!r}) > 0' for k in keywords)} THEN {category!r}"
+    for category, _, _, keywords in _ERROR_CATEGORIES
+) + f"\n    ELSE {_OTHER_ERROR_CATEGORY[0]!r}\nEND"
+
+
+def _categorize_error(error_type: str, error_msg: str) -> tuple:
+    """Return (category, border color, badge class) for an error"""
+    combined = error_type + ' ' + error_msg  # Check both for keywords
+    for category, border_color, badge_class, keywords in _ERROR_CATEGORIES:
+        if any(k in combined for k in keywords):
+            return category, border_color, badge_class
+    return _OTHER_ERROR_CATEGORY
+
+
+def _in_batches(chunks: Iterator[str], size: int = STREAM_BATCH_ROWS) -> Iterator[str]:
+    """Join row chunks into groups of `size` so each streamed write carries many rows"""
+    batch = []
+    for chunk in chunks:
+        batch.append(chunk)
+        if len(batch) >= size:
+            yield "".join(batch)
+            batch = []
+    if batch:
+        yield "".join(batch)
+
+
+def _iter_user_rows(users: List[Dict]) -> Iterator[str]:
+    """Yield one <tr> per user for the users table"""
+    if not users:
+        yield "<tr><td colspan='9' style='text-align: center; padding: 40px; color: #9ca3af;'>No users yet</td></tr>"
+    else:
+        for user in users:
+            total_profit = user['total_profit']
+            roi = user.get('roi', 0)
+            
+            # Error indicator with tooltip
+            error_count = user.get('recent_errors', 0)
+            if error_count > 0:
+                error_cell = f'''<span class="error-indicator error-has-errors" title="⚠️ {error_count} error(s) in last 24h - see Error History below">⚠️</span>'''
+            else:
+                error_cell = '''<span class="error-indicator error-none" title="✅ No errors in last 24h">✅</span>'''
+            
+            # Fingerprint display (first 8 chars or "Not Set")
+            fingerprint = user.get('kraken_id_display', None)
+            fingerprint_cell = f'<span class="api-key" title="Full: {html.escape(user.get("kraken_account_id") or "")}">{html.escape(fingerprint)}</span>' if fingerprint else '<span style="color: #6b7280;">—</span>'
+            
+            yield _USER_ROW_TEMPLATE.format_map({
+                'agent_status': user['agent_status'],
+                'status_emoji': user['status_emoji'],
+                'status_text': user['status_text'],
+                'email': html.escape(user['email'] or ''),
+                'api_key_short': html.escape(user['api_key_short']),
+                'fingerprint_cell': fingerprint_cell,
+                'capital': user.get('capital', 0),
+                'total_trades': user['total_trades'],
+                'profit_class': "profit-positive" if total_profit >= 0 else "profit-negative",
+                'profit_prefix': "+" if total_profit >= 0 else "",
+                'profit_abs': abs(total_profit),
+                'roi_prefix': "+" if roi >= 0 else "",
+                'roi': roi,
+                'error_cell': error_cell,
+            })
+
+
+def _iter_error_items(errors: List[Dict]) -> Iterator[str]:
+    """Yield one error-item <div> per error for Error History"""
+    if not errors:
+        yield "<div style='text-align: center; padding: 40px; color: #9ca3af;'>No errors recorded 🎉</div>"
+    else:
+        for error in errors:
+            error_type = error.get('error_type', 'unknown').lower()
+            error_msg = error.get('error_message', '')
+            # Rows from get_recent_errors are categorized in SQL
+            if error.get('category') in _ERROR_CATEGORY_STYLES:
+                error_category, border_color, badge_class = _ERROR_CATEGORY_STYLES[error['category']]
+            else:
+                error_category, border_color, badge_class = _categorize_error(error_type, error_msg.lower())
+            
+            # Format error message
+            if len(error_msg) > 300:
+                error_msg = error_msg[:300] + '...'
+            
+            # HTML-escape for safe display (prevents breaking HTML parsing)
+            error_msg_escaped = html.escape(error_msg)
+            
+            # User email for display
+            user_display = error.get('email', 'Unknown User')
+            
+            # Format timestamp for Singapore timezone (get_recent_errors rows
+            # arrive with it already formatted by Postgres)
+            timestamp = error.get('timestamp', '')
+            if error.get('timestamp_str'):
+                timestamp_str = error['timestamp_str']
+            elif timestamp:
+                try:
+                    timestamp_str = timestamp.strftime('%Y-%m-%d %H:%M:%S') + ' SGT'
+                except (AttributeError, ValueError):
+                    timestamp_str = str(timestamp)
+            else:
+                timestamp_str = 'N/A'
+            
+            yield _ERROR_ITEM_TEMPLATE.format_map({
+                'border_color': border_color,
+                'error_category': error_category,
+                'user_attr': html.escape(user_display.lower()),
+                'message_attr': error_msg_escaped.lower(),
+                'type_attr': html.escape(error_type),
+                'timestamp_str': timestamp_str,
+                'badge_class': badge_class,
+                'error_type': html.escape(error.get('error_type', 'Unknown')),
+                'user_display': html.escape(user_display),
+                'error_msg': error_msg_escaped,
+                'api_key_short': html.escape((error.get('api_key') or 'N/A')[:15]),
+            })
+
+
+# One tier-user card; each tier offers buttons to move users to the other two
+_TIER_USER_TEMPLATE = """
+                        <div class="tier-user" data-user-id="{id}">
+                            <span class="tier-user-email" title="{email}">{email}</span>
+                            <span class="tier-user-stats">${total_profit:.0f}</span>
+                            <div class="tier-user-actions">
+                                {buttons}
+                            </div>
+                        </div>
+                        """
+
+_TIER_MOVE_BUTTONS = {
+    'team': ('vip', 'standard'),
+    'vip': ('team', 'standard'),
+    'standard': ('team', 'vip'),
+}
+
+_TIER_BUTTON_LABELS = {
+    'team': ('Team', '🏠'),
+    'vip': ('VIP', '⭐'),
+    'standard': ('Standard', '👤'),
+}
+
+
+def _iter_tier_users(tier_users: List[Dict], tier: str, empty_html: str) -> Iterator[str]:
+    """Yield one card per user in a fee-tier column"""
+    if not tier_users:
+        yield empty_html
+        return
+    for u in tier_users:
+        buttons = "\n                                ".join(
+            f"""<button class="tier-btn to-{target}" onclick="changeTier({u['id']}, '{target}')" title="Move to {_TIER_BUTTON_LABELS[target][0]}">{_TIER_BUTTON_LABELS[target][1]}</button>"""
+            for target in _TIER_MOVE_BUTTONS[tier]
+        )
+        yield _TIER_USER_TEMPLATE.format_map({
+            'id': u['id'],
+            'email': html.escape(u['email'] or ''),
+            'total_profit': u['total_profit'],
+            'buttons': buttons,
+        })
+
+
+def _sgt_timestamp() -> str:
+    """Current time as shown in the dashboard header"""
+    return (datetime.utcnow() + timedelta(hours=8)).strftime('%Y-%m-%d %H:%M:%S') + ' SGT (GMT+8)'
+
+
+def _render_stats_grid(stats: Dict) -> str:
+    """Stat cards at the top of the dashboard"""
+    profit_color = "#10b981" if stats.get('total_profit', 0) >= 0 else "#ef4444"
+    profit_prefix = "+" if stats.get('total_profit', 0) >= 0 else ""
+    roi_color = "#10b981" if stats.get('platform_roi', 0) >= 0 else "#ef4444"
+    roi_prefix = "+" if stats.get('platform_roi', 0) >= 0 else ""
+    
+    return f"""        <div class="stats-grid" id="statsGrid">
+            <div class="stat-card">
+                <div class="stat-label">Total Users</div>
+                <div class="stat-value" style="color: #e5e7eb;">{stats.get('total_users', 0)}</div>
+                <div class="stat-sub">{stats.get('configured_users', 0)} configured</div>
+            </div>
+            <div class="stat-card">
+                <div class="stat-label">Active Now</div>
+                <div class="stat-value" style="color: #10b981;">{stats.get('active_now', 0)}</div>
+                <div class="stat-sub">{stats.get('active_percent', 0):.1f}% of configured</div>
+            </div>
+            <div class="stat-card">
+                <div class="stat-label">Total Trades</div>
+                <div class="stat-value" style="color: #e5e7eb;">{stats.get('total_trades', 0)}</div>
+            </div>
+            <div class="stat-card">
+                <div class="stat-label">Total Profit</div>
+                <div class="stat-value" style="color: {profit_color};">{profit_prefix}${abs(stats.get('total_profit', 0)):.2f}</div>
+                <div class="stat-sub">${stats.get('avg_profit', 0):.2f} avg/user</div>
+            </div>
+            <div class="stat-card">
+                <div class="stat-label">Platform Capital</div>
+                <div class="stat-value" style="color: #e5e7eb;">${stats.get('platform_capital', 0):,.0f}</div>
+            </div>
+            <div class="stat-card">
+                <div class="stat-label">Current Value</div>
+                <div class="stat-value" style="color: #e5e7eb;">${stats.get('current_value', 0):,.0f}</div>
+            </div>
+            <div class="stat-card">
+                <div class="stat-label">Platform ROI</div>
+                <div class="stat-value" style="color: {roi_color};">{roi_prefix}{stats.get('platform_roi', 0):.1f}%</div>
+            </div>
+            <div class="stat-card">
+                <div class="stat-label">Errors (1H)</div>
+                <div class="stat-value" style="color: {'#ef4444' if stats.get('errors_1h', 0) > 0 else '#10b981'};">{stats.get('errors_1h', 0)}</div>
+            </div>
+        </div>"""
+
+
+def iter_admin_html(users: List[Dict], errors: List[Dict], stats: Dict, review_positions: List[Dict] = None, users_by_tier: Dict = None) -> Iterator[str]:
+    """
+    Generate admin dashboard HTML - Dark Theme with Error Tooltips
+    
+    Yields the page in pieces (static shell, then tier cards, user rows and
+    error items in batches of STREAM_BATCH_ROWS) so the route can stream it
+    instead of building one large string.
+    """
+    
+    # Handle backward compatibility
+    if review_positions is None:
+        review_positions = []
+    if users_by_tier is None:
+        users_by_tier = {'team': [], 'vip': [], 'standard': []}
+    
+    # Review positions section
+    review_positions_section = ""
+    if review_positions:
+        review_parts = []
+        for pos in review_positions:
+            side_color = "#10b981" if pos['side'].upper() in ('BUY', 'LONG') else "#ef4444"
+            review_parts.append(f"""
+                <tr>
+                    <td>{html.escape(pos['email'] or '')}</td>
+                    <td><span style="color: {side_color}; font-weight: 600;">{html.escape(pos['side'])}</span> {html.escape(pos['symbol'] or '')}</td>
+                    <td>{pos['quantity']:.4f} @ {pos['leverage']}x</td>
+                    <td>${pos['entry']:.2f}</td>
+                    <td><span style="color: #10b981">${pos['tp']:.2f}</span></td>
+                    <td><span style="color: #ef4444">${pos['sl']:.2f}</span></td>
+                    <td>{(pos['opened_at'] + timedelta(hours=8)).strftime('%Y-%m-%d %H:%M') + ' SGT' if pos['opened_at'] else 'N/A'}</td>
+                    <td style="color: #f59e0b;">{html.escape(str(pos['reason']))}</td>
+                    <td>
+                        <a href="#" onclick="deletePosition({pos['id']}); return false;" style="color: #ef4444; text-decoration: none;">🗑️ Delete</a>
+                    </td>
+                </tr>
+            """)
+        review_rows = "".join(review_parts)
+        
+        review_positions_section = f"""
+        <div class="users-section" style="border: 2px solid #f59e0b;">
+            <h2 style="color: #fbbf24;">🔍 Positions Needing Review ({len(review_positions)})</h2>
+            <p style="color: #9ca3af; margin-bottom: 15px; font-size: 13px;">
+                These positions were manually closed or had unusual closure patterns. Review and delete when confirmed.
+            </p>
+            <table>
+                <thead>
+                    <tr>
+                        <th>User</th>
+                        <th>Position</th>
+                        <th>Size</th>
+                        <th>Entry</th>
+                        <th>TP</th>
+                        <th>SL</th>
+                        <th>Opened</th>
+                        <th>Reason</th>
+                        <th>Action</th>
+                    </tr>
+                </thead>
+                <tbody>{review_rows}</tbody>
+            </table>
+        </div>
+        """
+    
+    yield _ADMIN_HTML_HEAD
+    yield f"""    <div class="container">
+        <div class="header">
+            <div>
+                <h1>🚀 $NIKEPIG Admin Dashboard</h1>
+                <div class="timestamp" id="dashboardTimestamp">{_sgt_timestamp()}</div>
+            </div>
+            <button class="refresh-btn" onclick="refreshDashboard()">
+                🔄 Refresh
+            </button>
+        </div>
+        
+"""
+    yield _render_stats_grid(stats)
+    yield _TAX_REPORTS_SECTION
+    yield f"""        <!-- User Fee Tiers Section -->
+        <div class="tiers-section">
+            <h2>💰 User Fee Tiers</h2>
+            <div class="tiers-grid">
+                <!-- Team Column (0%) -->
+                <div class="tier-column team">
+                    <div class="tier-header team">
+                        <h3>🏠 Team (0%)</h3>
+                        <span class="tier-count">{len(users_by_tier.get('team', []))} users</span>
+                    </div>
+                    <div class="tier-users" id="tier-team">
+                        """
+    yield from _in_batches(_iter_tier_users(users_by_tier.get('team', []), 'team', '<div class="tier-empty">No team members</div>'))
+    yield f"""
+                    </div>
+                </div>
+                
+                <!-- VIP Column (5%) -->
+                <div class="tier-column vip">
+                    <div class="tier-header vip">
+                        <h3>⭐ VIP (5%)</h3>
+                        <span class="tier-count">{len(users_by_tier.get('vip', []))} users</span>
+                    </div>
+                    <div class="tier-users" id="tier-vip">
+                        """
+    yield from _in_batches(_iter_tier_users(users_by_tier.get('vip', []), 'vip', '<div class="tier-empty">No VIP users</div>'))
+    yield f"""
+                    </div>
+                </div>
+                
+                <!-- Standard Column (10%) -->
+                <div class="tier-column standard">
+                    <div class="tier-header standard">
+                        <h3>👤 Standard (10%)</h3>
+                        <span class="tier-count">{len(users_by_tier.get('standard', []))} users</span>
+                    </div>
+                    <div class="tier-users" id="tier-standard">
+                        """
+    yield from _in_batches(_iter_tier_users(users_by_tier.get('standard', []), 'standard', '<div class="tier-empty">No standard users</div>'))
+    yield f"""
+                    </div>
+                </div>
+            </div>
+        </div>
+        
+        <div class="users-section">
+            <h2>👥 Users ({stats.get('total_users', 0)})</h2>
+            <div class="search-box">
+                <input 
+                    type="text" 
+                    id="userSearch" 
+                    class="search-input" 
+                    placeholder="🔍 Search by email or API key..."
+                    onkeyup="filterUsers()"
+                />
+                <button class="clear-search" onclick="clearSearch()">Clear</button>
+            </div>
+            <table id="usersTable">
+                <thead>
+                    <tr>
+                        <th>Status</th>
+                        <th>Email</th>
+                        <th>API Key</th>
+                        <th>Fingerprint</th>
+                        <th>Capital</th>
+                        <th>Trades</th>
+                        <th>Profit</th>
+                        <th>ROI</th>
+                        <th>Errors</th>
+                    </tr>
+                </thead>
+                <tbody id="usersBody">"""
+    
+    yield from _in_batches(_iter_user_rows(users))
+    
+    yield f"""</tbody>
+            </table>
+        </div>
+        
+        {review_positions_section}
+        
+"""
+    yield _ERRORS_SECTION_HEAD
+    
+    yield from _in_batches(_iter_error_items(errors))
+    
+    yield f"""</div>
+            <div class="pagination" id="errorPagination"></div>
+            {_render_older_errors_control(errors)}
+        </div>
+    </div>
+    
+"""
+    
+    yield _ADMIN_SCRIPT_HEAD
+    yield str(stats.get('total_users', 0))
+    yield _ADMIN_SCRIPT_TAIL
+
+
+def _older_errors_cursor(errors: List[Dict]) -> Optional[int]:
+    """Keyset cursor for the next Error History page (None when this was the last)"""
+    if len(errors) < ERRORS_PAGE_SIZE:
+        return None
+    return errors[-1].get('id')
+
+
+def _render_older_errors_control(errors: List[Dict]) -> str:
+    """'Load older errors' button, hidden when there is nothing older"""
+    cursor = _older_errors_cursor(errors)
+    hidden = '' if cursor else ' style="display: none;"'
+    return f"""<div class="pagination" id="olderErrors"{hidden}>
+                <button class="page-btn" id="loadOlderErrorsBtn" data-before-id="{cursor or ''}" onclick="loadOlderErrors()">⬇️ Load older errors</button>
+            </div>"""
+
+
+def get_error_page_data(errors: List[Dict]) -> Dict:
+    """Pre-rendered error items for one older Error History page"""
+    return {
+        'error_items_html': "".join(_iter_error_items(errors)) if errors else "",
+        'before_id': _older_errors_cursor(errors),
+    }
+
+
+def generate_admin_html(users: List[Dict], errors: List[Dict], stats: Dict, review_positions: List[Dict] = None, users_by_tier: Dict = None) -> str:
+    """Generate admin dashboard HTML as one string (see iter_admin_html)"""
+    return "".join(iter_admin_html(users, errors, stats, review_positions, users_by_tier))
+
+
+def iter_and_cache_html(key: str, chunks: Iterator[str]) -> Iterator[str]:
+    """Pass page chunks through, caching the whole page once the last one is sent"""
+    parts = []
+    for chunk in chunks:
+        parts.append(chunk)
+        yield chunk
+    admin_html_cache.set(key, "".join(parts))
+
+
+def get_dashboard_data(users: List[Dict], errors: List[Dict], stats: Dict) -> Dict:
+    """
+    Stats and pre-rendered rows for the Refresh button's in-place update
+    (same templates as the full page, without the CSS/script shell)
+    """
+    return {
+        'timestamp': _sgt_timestamp(),
+        'total_users': stats.get('total_users', 0),
+        'stats_html': _render_stats_grid(stats),
+        'user_rows_html': "".join(_iter_user_rows(users)),
+        'error_items_html': "".join(_iter_error_items(errors)),
+        'errors_before_id': _older_errors_cursor(errors),
+    }
@@ -19,11 +19,13 @@ Version: 3.3 (Consolidated + Error Logging + Email Notifications)
 """
 import asyncio
 import asyncpg
+import ccxt
 import os
 import json
 from decimal import Decimal
 from datetime import datetime, timedelta
 import logging
+from functools import lru_cache
 from cryptography.fernet import Fernet
 from typing import Optional, Dict
 
@@ -57,12 +59,26 @@ if ENCRYPTION_KEY:
 else:
     cipher = None
 
+# Max users checked at once (each check holds a Kraken call and at most one DB
+# connection). Also capped by pool size - see BalanceChecker._check_concurrency
+BALANCE_CHECK_CONCURRENCY = int(os.getenv("BALANCE_CHECK_CONCURRENCY", "10"))
+
+# pg advisory lock key: only one worker runs a balance check cycle at a time
+BALANCE_CHECK_LOCK_ID = 7_420_614_001
+
 
 def decrypt_credentials(encrypted_key: str, encrypted_secret: str) -> tuple:
     """Decrypt Kraken API credentials"""
     if not cipher or not encrypted_key or not encrypted_secret:
         return None, None
     
+    return _decrypt_cached(encrypted_key, encrypted_secret)
+
+
+# Keyed by ciphertext, so rotated credentials miss naturally. Plaintext keys
+# stay in process memory until stop() clears the cache.
+@lru_cache(maxsize=1024)
+def _decrypt_cached(encrypted_key: str, encrypted_secret: str) -> tuple:
     try:
         api_key = cipher.decrypt(encrypted_key.encode()).decode()
         api_secret = cipher.decrypt(encrypted_secret.encode()).decode()
@@ -81,28 +97,70 @@ class BalanceChecker:
     
     def __init__(self, db_pool):
         self.db_pool = db_pool
+        # Set once follower_users is seen; tables are not dropped at runtime
+        self._tables_ready = False
+        # One ccxt client per Kraken key, so its rate limiter spaces every call
+        # made with that key (Kraken counts per account) and markets load once
+        self._exchanges = {}
 
 
     async def check_all_users(self):
         """
         Check balance for all users with portfolio tracking enabled
         
+        SINGLE RUNNER: Holds a Postgres advisory lock for the whole cycle so
+        multiple workers (or a restart mid-cycle) never check the same users twice
+        """
+        async with self.db_pool.acquire() as lock_conn:
+            got_lock = await lock_conn.fetchval(
+                "SELECT pg_try_advisory_lock($1)", BALANCE_CHECK_LOCK_ID
+            )
+            if not got_lock:
+                logger.info("⏭️ Balance check already running in another worker - skipping")
+                return
+            
+            try:
+                await self._check_all_users()
+            finally:
+                await lock_conn.execute(
+                    "SELECT pg_advisory_unlock($1)", BALANCE_CHECK_LOCK_ID
+                )
+
+
+    def _check_concurrency(self) -> int:
+        """
+        How many users to check at once
+        
+        The pool is shared with the trading loop and admin endpoints, and the
+        advisory lock already holds one connection for the whole cycle. Each
+        check uses at most one connection at a time, so capping checks at half
+        of what's left keeps the other half free for everyone else.
+        """
+        max_size = self.db_pool.get_max_size()
+        return max(1, min(BALANCE_CHECK_CONCURRENCY, (max_size - 1) // 2))
+
+
+    async def _check_all_users(self):
+        """
+        Run one balance check cycle (caller holds the advisory lock)
+        
         CONSOLIDATED: Queries follower_users directly
         """
         try:
             async with self.db_pool.acquire() as conn:
                 
-                # Check if required tables exist (graceful check)
-                table_check = await conn.fetchval("""
-                    SELECT EXISTS (
-                        SELECT FROM information_schema.tables 
-                        WHERE table_name = 'follower_users'
-                    )
-                """)
-                
-                if not table_check:
-                    logger.info("✓ Tables not yet created")
-                    return
+                # Check if required tables exist (graceful check, cached once found)
+                if not self._tables_ready:
+                    self._tables_ready = await conn.fetchval("""
+                        SELECT EXISTS (
+                            SELECT FROM information_schema.tables 
+                            WHERE table_name = 'follower_users'
+                        )
+                    """)
+                    
+                    if not self._tables_ready:
+                        logger.info("✓ Tables not yet created")
+                        return
                 
                 # CONSOLIDATED: Query follower_users where portfolio is initialized
                 users = await conn.fetch("""
@@ -117,14 +175,20 @@ class BalanceChecker:
                       AND fu.kraken_api_secret_encrypted IS NOT NULL
                       AND fu.portfolio_initialized = true
                 """)
-                
-                if not users:
-                    logger.info("✓ No active users to check balance for")
-                    return
-                
-                logger.info(f"📊 Checking balance for {len(users)} active users...")
-                
-                for user in users:
+            
+            if not users:
+                logger.info("✓ No active users to check balance for")
+                return
+            
+            logger.info(f"📊 Checking balance for {len(users)} active users...")
+            
+            # PARALLEL: Kraken calls and DB queries overlap across users.
+            # The semaphore keeps us under Kraken's rate limit and the pool size.
+            semaphore = asyncio.Semaphore(self._check_concurrency())
+            pending_balances = []
+            
+            async def _check_one(user):
+                async with semaphore:
                     try:
                         # Decrypt credentials
                         kraken_key, kraken_secret = decrypt_credentials(
@@ -134,13 +198,14 @@ class BalanceChecker:
                         
                         if not kraken_key or not kraken_secret:
                             logger.warning(f"⚠️  Could not decrypt credentials for {user['api_key'][:15]}...")
-                            continue
+                            return
                         
                         await self.check_user_balance(
                             user['id'],
                             user['api_key'],
                             kraken_key,
-                            kraken_secret
+                            kraken_secret,
+                            pending_balances
                         )
                     except Exception as e:
                         logger.error(f"Error checking user {user['api_key'][:15]}...: {e}")
@@ -156,8 +221,20 @@ class BalanceChecker:
                                 error=str(e),
                                 user_api_key=user['api_key']
                             )
-                        
-                logger.info("✅ Balance check complete. Next check in 60 minutes")
+            
+            try:
+                await asyncio.gather(*[
+                    _check_one(user) for user in users
+                ], return_exceptions=True)
+            finally:
+                # BATCHED: One executemany for every user's new last_known_balance.
+                # In finally so completed readings still reach the dashboard
+                # if the cycle is cancelled or fails part-way
+                if pending_balances:
+                    await self.update_last_known_balances(pending_balances)
+                    logger.info(f"📊 Updated last_known_balance for {len(pending_balances)} users (total equity)")
+            
+            logger.info("✅ Balance check complete. Next check in 60 minutes")
                 
         except Exception as e:
             logger.error(f"Error in check_all_users: {e}")
@@ -181,11 +258,15 @@ class BalanceChecker:
         user_id: int,
         api_key: str, 
         kraken_api_key: str, 
-        kraken_api_secret: str
+        kraken_api_secret: str,
+        pending_balances: Optional[list] = None
     ):
         """
         Check a single user's balance and detect changes
         
+        If pending_balances is given, the new last_known_balance is appended
+        to it as (balance, user_id) for a batched update instead of written here.
+        
         IMPROVED: Better logic to distinguish trading losses/fees from actual withdrawals
         ISSUE #3 FIX: Also checks exchange transaction history
         
@@ -298,6 +379,9 @@ class BalanceChecker:
             logger.info(f"   Found {len(exchange_txs)} transactions via exchange API")
         
         # Update last known balance with TOTAL EQUITY (for dashboard display)
+        if pending_balances is not None:
+            pending_balances.append((float(total_equity), user_id))
+            return
         await self.update_last_known_balance(user_id, api_key, total_equity)
         logger.info(f"   📊 Updated last_known_balance to ${total_equity:.2f} (total equity)")
     
@@ -375,13 +459,7 @@ class BalanceChecker:
         Returns list of new transactions found
         """
         try:
-            import ccxt
-            
-            exchange = ccxt.krakenfutures({
-                'apiKey': kraken_api_key,
-                'secret': kraken_api_secret,
-                'enableRateLimit': True,
-            })
+            exchange = self._get_exchange(kraken_api_key, kraken_api_secret)
             
             new_transactions = []
             
@@ -472,6 +550,23 @@ class BalanceChecker:
             return []
 
 
+    def _get_exchange(self, api_key: str, api_secret: str):
+        """Get (or create) the shared Kraken Futures CCXT client for a key"""
+        exchange = self._exchanges.get(api_key)
+        if exchange is None or exchange.secret != api_secret:
+            exchange = ccxt.krakenfutures({
+                'apiKey': api_key,
+                'secret': api_secret,
+                'enableRateLimit': True,
+                'timeout': 30000,  # 30 second timeout
+                'options': {
+                    'defaultType': 'future',
+                }
+            })
+            self._exchanges[api_key] = exchange
+        return exchange
+
+
     async def get_kraken_balance(
         self, 
         api_key: str, 
@@ -495,23 +590,13 @@ class BalanceChecker:
         
         for attempt in range(max_retries):
             try:
-                import ccxt
-                
                 if attempt > 0:
                     logger.info(f"🔄 Retry attempt {attempt + 1}/{max_retries} for Kraken balance fetch...")
                 else:
                     logger.info("🔐 Fetching balance from Kraken Futures via CCXT...")
                 
-                # Initialize Kraken Futures exchange using CCXT
-                exchange = ccxt.krakenfutures({
-                    'apiKey': api_key,
-                    'secret': api_secret,
-                    'enableRateLimit': True,
-                    'timeout': 30000,  # 30 second timeout
-                    'options': {
-                        'defaultType': 'future',
-                    }
-                })
+                # Kraken Futures exchange (CCXT), shared per key
+                exchange = self._get_exchange(api_key, api_secret)
                 
                 # Fetch balance synchronously in thread (CCXT is sync)
                 balance = await asyncio.to_thread(exchange.fetch_balance)
@@ -616,50 +701,35 @@ class BalanceChecker:
         """
         async with self.db_pool.acquire() as conn:
             
-            # Try to get initial capital from follower_users first
-            fu_info = await conn.fetchrow("""
-                SELECT initial_capital
-                FROM follower_users
-                WHERE id = $1
-            """, user_id)
-            
-            initial_capital = float(fu_info['initial_capital'] or 0) if fu_info and fu_info['initial_capital'] else 0.0
-            
-            # Get deposits from portfolio_transactions
-            # Try new FK first, fall back to api_key
-            deposits_result = await conn.fetchval("""
-                SELECT COALESCE(SUM(amount), 0)
-                FROM portfolio_transactions
-                WHERE (follower_user_id = $1 OR user_id = $2) 
-                  AND transaction_type = 'deposit'
-            """, user_id, api_key)
-            total_deposits = float(deposits_result or 0)
-            
-            # Get withdrawals from portfolio_transactions
-            # Include both legacy 'withdrawal' and new 'fees_funding_withdrawal' types
-            withdrawals_result = await conn.fetchval("""
-                SELECT COALESCE(SUM(amount), 0)
+            # One round-trip: initial capital plus transaction and trade sums.
+            # Transactions match either FK; withdrawals include both legacy
+            # 'withdrawal' and new 'fees_funding_withdrawal' types; trading P&L
+            # comes from closed trades (recorded by position monitor).
+            # Cast to numeric so asyncpg hands back Decimals directly
+            row = await conn.fetchrow("""
+                SELECT
+                    COALESCE(
+                        (SELECT initial_capital FROM follower_users WHERE id = $1), 0
+                    )::numeric AS initial_capital,
+                    COALESCE(SUM(amount) FILTER (WHERE transaction_type = 'deposit'), 0)::numeric AS deposits,
+                    COALESCE(SUM(amount) FILTER (
+                        WHERE transaction_type IN ('withdrawal', 'fees_funding_withdrawal')
+                    ), 0)::numeric AS withdrawals,
+                    (SELECT COALESCE(SUM(profit_usd), 0)
+                     FROM trades
+                     WHERE user_id = $1 AND closed_at IS NOT NULL)::numeric AS trading_pnl
                 FROM portfolio_transactions
-                WHERE (follower_user_id = $1 OR user_id = $2)
-                  AND transaction_type IN ('withdrawal', 'fees_funding_withdrawal')
+                WHERE follower_user_id = $1 OR user_id = $2
             """, user_id, api_key)
-            total_withdrawals = float(withdrawals_result or 0)
             
-            # Get trading P&L from trades table (closed trades only)
-            # This is where position monitor records actual trade results
-            trading_pnl_result = await conn.fetchval("""
-                SELECT COALESCE(SUM(profit_usd), 0)
-                FROM trades
-                WHERE user_id = $1 AND closed_at IS NOT NULL
-            """, user_id)
-            trading_pnl = float(trading_pnl_result or 0)
+            initial_capital = row['initial_capital']
+            total_deposits = row['deposits']
+            total_withdrawals = row['withdrawals']
+            trading_pnl = row['trading_pnl']
             
             # Calculate expected balance
             # Formula: Initial + Deposits - Withdrawals + Trading P&L
-            expected = Decimal(str(initial_capital)) + \
-                      Decimal(str(total_deposits)) - \
-                      Decimal(str(total_withdrawals)) + \
-                      Decimal(str(trading_pnl))
+            expected = initial_capital + total_deposits - total_withdrawals + trading_pnl
             
             logger.info(
                 f"Expected balance for {api_key[:10]}...: ${expected:.2f} "
@@ -770,6 +840,20 @@ class BalanceChecker:
             """, float(balance), user_id)
 
 
+    async def update_last_known_balances(self, balances: list):
+        """
+        Update last known balances for many users in one batch
+        
+        balances: list of (balance, user_id) tuples
+        """
+        async with self.db_pool.acquire() as conn:
+            await conn.executemany("""
+                UPDATE follower_users 
+                SET last_known_balance = $1
+                WHERE id = $2
+            """, balances)
+
+
     async def get_balance_summary(
         self, 
         api_key: str
@@ -778,18 +862,39 @@ class BalanceChecker:
         Get comprehensive balance summary for a user
         """
         async with self.db_pool.acquire() as conn:
-            # Get user ID from follower_users
+            # One round-trip: user row plus transaction and trade aggregates
+            # (use both FKs for compatibility; withdrawals include legacy and new type)
             user_row = await conn.fetchrow("""
-                SELECT id, initial_capital, last_known_balance, portfolio_initialized
-                FROM follower_users
-                WHERE api_key = $1
+                SELECT
+                    fu.initial_capital,
+                    fu.last_known_balance,
+                    COALESCE(tx.deposits, 0) AS deposits,
+                    COALESCE(tx.withdrawals, 0) AS withdrawals,
+                    COALESCE(tr.profit, 0) AS profit,
+                    COALESCE(tr.first_opened_at, fu.started_tracking_at) AS started_tracking
+                FROM follower_users fu
+                CROSS JOIN LATERAL (
+                    SELECT
+                        SUM(amount) FILTER (WHERE transaction_type = 'deposit') AS deposits,
+                        SUM(amount) FILTER (
+                            WHERE transaction_type IN ('withdrawal', 'fees_funding_withdrawal')
+                        ) AS withdrawals
+                    FROM portfolio_transactions
+                    WHERE follower_user_id = fu.id OR user_id = fu.api_key
+                ) tx
+                CROSS JOIN LATERAL (
+                    SELECT
+                        SUM(profit_usd) FILTER (WHERE closed_at IS NOT NULL) AS profit,
+                        MIN(opened_at) AS first_opened_at
+                    FROM trades
+                    WHERE user_id = fu.id
+                ) tr
+                WHERE fu.api_key = $1
             """, api_key)
             
             if not user_row:
                 return None
             
-            user_id = user_row['id']
-            
             # Get initial capital from follower_users
             initial = float(user_row['initial_capital'] or 0)
             current = float(user_row['last_known_balance'] or 0)
@@ -797,39 +902,10 @@ class BalanceChecker:
             if initial == 0:
                 return None
             
-            # Get deposits (use both FKs for compatibility)
-            deposits_result = await conn.fetchval("""
-                SELECT COALESCE(SUM(amount), 0)
-                FROM portfolio_transactions
-                WHERE (follower_user_id = $1 OR user_id = $2)
-                  AND transaction_type = 'deposit'
-            """, user_id, api_key)
-            deposits = float(deposits_result or 0)
-            
-            # Get withdrawals (include both legacy and new type)
-            withdrawals_result = await conn.fetchval("""
-                SELECT COALESCE(SUM(amount), 0)
-                FROM portfolio_transactions
-                WHERE (follower_user_id = $1 OR user_id = $2)
-                  AND transaction_type IN ('withdrawal', 'fees_funding_withdrawal')
-            """, user_id, api_key)
-            withdrawals = float(withdrawals_result or 0)
-            
-            # Get trading P&L from actual trades
-            profit_result = await conn.fetchval("""
-                SELECT COALESCE(SUM(profit_usd), 0)
-                FROM trades
-                WHERE user_id = $1 AND closed_at IS NOT NULL
-            """, user_id)
-            profit = float(profit_result or 0)
-            
-            # Get when user started tracking (first trade or portfolio init)
-            started_tracking = await conn.fetchval("""
-                SELECT COALESCE(
-                    (SELECT MIN(opened_at) FROM trades WHERE user_id = $1),
-                    (SELECT started_tracking_at FROM follower_users WHERE id = $1)
-                )
-            """, user_id)
+            deposits = float(user_row['deposits'] or 0)
+            withdrawals = float(user_row['withdrawals'] or 0)
+            profit = float(user_row['profit'] or 0)
+            started_tracking = user_row['started_tracking']
             
             # If current_value is 0 or None, recalculate from components
             if current == 0:
@@ -1002,6 +1078,8 @@ class BalanceCheckerScheduler:
                 await self.task
             except asyncio.CancelledError:
                 pass
+            _decrypt_cached.cache_clear()
+            self.checker._exchanges.clear()
             logger.info("🛑 Balance checker stopped")
 
 
@@ -27,6 +27,7 @@ from fastapi.responses import JSONResponse, HTMLResponse
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta, timezone
 from typing import Optional, List, Dict
+import asyncio
 import os
 import secrets
 import hashlib
@@ -44,6 +45,8 @@ from follower_models import (
 # Import email service
 from email_service import send_welcome_email, send_api_key_resend_email
 
+from db import get_database_url
+
 # Initialize logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -320,19 +323,29 @@ class SetupAgentRequest(BaseModel):
 
 # ==================== DEPENDENCY INJECTION ====================
 
+_engine = None
+
+
+def _get_engine():
+    """
+    SQLAlchemy engine shared by every request.
+    
+    Built on first use with the URL normalized once; creating an engine per
+    request would also build (and leak) a new connection pool each time.
+    """
+    global _engine
+    if _engine is None:
+        from sqlalchemy import create_engine
+        DATABASE_URL = get_database_url()
+        if not DATABASE_URL:
+            raise Exception("DATABASE_URL not set")
+        _engine = create_engine(DATABASE_URL)
+    return _engine
+
+
 def get_db():
     """Database session dependency"""
-    from sqlalchemy import create_engine
-    DATABASE_URL = os.getenv("DATABASE_URL")
-    if not DATABASE_URL:
-        raise Exception("DATABASE_URL not set")
-    
-    # Handle Railway postgres:// to postgresql://
-    if DATABASE_URL.startswith("postgres://"):
-        DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
-    
-    engine = create_engine(DATABASE_URL)
-    session = get_db_session(engine)
+    session = get_db_session(_get_engine())
     try:
         yield session
     finally:
@@ -617,7 +630,7 @@ async def confirm_execution(
         if data.executed_at:
             try:
                 executed_at = datetime.fromisoformat(data.executed_at.replace('Z', '+00:00'))
-            except:
+            except ValueError:
                 pass  # Use default
         
         # Mark as acknowledged AND executed
@@ -1647,31 +1660,31 @@ async def get_agent_logs(
 ):
     """Get recent agent logs for a specific user."""
     try:
-        import psycopg2
-        DATABASE_URL = os.getenv("DATABASE_URL")
-        
-        conn = psycopg2.connect(DATABASE_URL)
-        cur = conn.cursor()
-        
-        cur.execute("""
-            SELECT timestamp, event_type, event_data
-            FROM agent_logs
-            WHERE api_key = %s
-            ORDER BY timestamp DESC
-            LIMIT %s
-        """, (x_api_key, limit))
-        
+        # Pooled psycopg2 connection (module get_db is the SQLAlchemy session)
+        from admin_dashboard import get_db as get_pooled_conn, execute_prepared
+        
+        # Every agent polls this with its own key: prepared once per pooled
+        # connection, each poll skips parse/plan
+        def fetch_logs():
+            with get_pooled_conn(readonly=True) as conn, conn.cursor() as cur:
+                execute_prepared(cur, """
+                    SELECT timestamp, event_type, event_data
+                    FROM agent_logs
+                    WHERE api_key = $1
+                    ORDER BY timestamp DESC
+                    LIMIT $2
+                """, (x_api_key, limit))
+                return cur.fetchall()
+        
+        # psycopg2 (and waiting for a pool slot) blocks - keep it off the event loop
         logs = []
-        for row in cur.fetchall():
+        for row in await asyncio.to_thread(fetch_logs):
             logs.append({
                 "timestamp": row[0].isoformat() if row[0] else None,
                 "event_type": row[1],
                 "event_data": row[2]
             })
         
-        cur.close()
-        conn.close()
-        
         return {"status": "success", "logs": logs, "count": len(logs)}
         
     except Exception as e:
@@ -1687,23 +1700,24 @@ async def get_my_errors(
 ):
     """Get recent errors for a specific user."""
     try:
-        import psycopg2
-        DATABASE_URL = os.getenv("DATABASE_URL")
-        
-        conn = psycopg2.connect(DATABASE_URL)
-        cur = conn.cursor()
-        
-        cur.execute("""
-            SELECT timestamp, error_type, error_message, context
-            FROM error_logs
-            WHERE api_key = %s
-            AND timestamp > NOW() - INTERVAL '%s hours'
-            ORDER BY timestamp DESC
-            LIMIT %s
-        """, (x_api_key, hours, limit))
-        
+        # Pooled psycopg2 connection (module get_db is the SQLAlchemy session)
+        from admin_dashboard import get_db as get_pooled_conn, execute_prepared
+        
+        def fetch_errors():
+            with get_pooled_conn(readonly=True) as conn, conn.cursor() as cur:
+                execute_prepared(cur, """
+                    SELECT timestamp, error_type, error_message, context
+                    FROM error_logs
+                    WHERE api_key = $1
+                    AND timestamp > NOW() - make_interval(hours => $2)
+                    ORDER BY timestamp DESC
+                    LIMIT $3
+                """, (x_api_key, hours, limit))
+                return cur.fetchall()
+        
+        # psycopg2 (and waiting for a pool slot) blocks - keep it off the event loop
         errors = []
-        for row in cur.fetchall():
+        for row in await asyncio.to_thread(fetch_errors):
             errors.append({
                 "timestamp": row[0].isoformat() if row[0] else None,
                 "error_type": row[1],
@@ -1711,9 +1725,6 @@ async def get_my_errors(
                 "context": row[3]
             })
         
-        cur.close()
-        conn.close()
-        
         return {"status": "success", "errors": errors, "count": len(errors)}
         
     except Exception as e:
@@ -14,10 +14,10 @@ Updated: November 29, 2025 - WITH ERROR LOGGING
 from fastapi import FastAPI, Request, HTTPException, Header
 from fastapi.responses import JSONResponse
 from typing import Optional
-import json
 import traceback
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import HTMLResponse, FileResponse, StreamingResponse, Response
 from sqlalchemy import create_engine
 import os
 import asyncio
@@ -42,11 +42,26 @@ from admin_dashboard import (
     get_stats_summary,
     get_positions_needing_review,
     get_users_by_tier,
-    generate_admin_html,
+    iter_admin_html,
+    iter_and_cache_html,
+    admin_html_cache,
+    dashboard_cache,
+    get_dashboard_etag,
+    note_dashboard_write,
+    get_dashboard_data,
+    get_error_page_data,
     create_error_logs_table,
+    start_admin_rollup_refresher,
+    get_db,
+    log_error,
+    iter_error_log_csv,
+    ADMIN_CSS,
     ADMIN_PASSWORD
 )
 
+# Shared asyncpg pool for admin endpoints
+from db import get_pool as get_async_pool
+
 # Import hosted trading loop for automatic signal execution
 from hosted_trading_loop import start_hosted_trading
 
@@ -92,31 +107,45 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress text responses (dashboard HTML, JSON, CSV exports); tiny API
+# replies stay uncompressed
+app.add_middleware(GZipMiddleware, minimum_size=1000)
+
+
+# Admin writes (tier changes, deletes, resets, billing actions) move the
+# dashboard ETag at once, so the page's reload after a write is never a
+# 304 or a cached copy of the old state
+@app.middleware("http")
+async def note_admin_writes(request: Request, call_next):
+    response = await call_next(request)
+    path = request.url.path
+    if (request.method in ("POST", "PUT", "PATCH", "DELETE")
+            and (path.startswith("/admin") or path.startswith("/api/admin"))
+            and response.status_code < 400):
+        note_dashboard_write()
+    return response
+
 
 # ==================== GLOBAL EXCEPTION HANDLER ====================
 # Catches ALL unhandled exceptions and logs them to error_logs table
 # for visibility in the admin dashboard
 
 async def log_error_to_db_global(api_key: str, error_type: str, error_message: str, context: dict = None):
-    """Log error to error_logs table (used by global exception handler)"""
+    """
+    Log error to error_logs table (used by global exception handler)
+    
+    Goes through admin_dashboard's batched log queue instead of opening a
+    connection per error. Run in a worker thread because a full queue falls
+    back to a direct write, which must not block the event loop.
+    """
     try:
-        db_url = os.getenv("DATABASE_URL")
-        if db_url and db_url.startswith("postgres://"):
-            db_url = db_url.replace("postgres://", "postgresql://", 1)
-        
-        if not db_url:
-            return
-            
-        conn = await asyncpg.connect(db_url)
-        await conn.execute(
-            """INSERT INTO error_logs (api_key, error_type, error_message, context) 
-               VALUES ($1, $2, $3, $4)""",
+        await asyncio.to_thread(
+            log_error,
             api_key[:20] + "..." if api_key and len(api_key) > 20 else api_key,
             error_type,
             error_message[:500] if error_message else None,
-            json.dumps(context) if context else None
+            context or None
         )
-        await conn.close()
     except Exception as e:
         print(f"Failed to log error to DB: {e}")
 
@@ -157,7 +186,7 @@ async def global_exception_handler(request: Request, exc: Exception):
                 "traceback": tb[:500]
             }
         )
-    except:
+    except Exception:
         pass  # Don't fail the response if logging fails
     
     # Send email notification for critical/security errors
@@ -188,7 +217,7 @@ async def global_exception_handler(request: Request, exc: Exception):
                 user_api_key=api_key if api_key != "unknown" else None,
                 context={"traceback": tb[:200]}
             )
-    except:
+    except Exception:
         pass  # Don't fail if notification fails
     
     # Return error response
@@ -306,11 +335,12 @@ async def test_email():
 
 # Admin Dashboard (NEW!)
 @app.get("/admin", response_class=HTMLResponse)
-async def admin_dashboard(password: str = ""):
+async def admin_dashboard(request: Request, password: str = "", refresh: bool = False):
     """
     Admin dashboard to monitor hosted follower agents
     
     Access: /admin?password=YOUR_ADMIN_PASSWORD
+    Add &refresh=1 to skip the cached page and cached reads (manual checks).
     
     Shows:
     - User signups
@@ -418,23 +448,43 @@ async def admin_dashboard(password: str = ""):
             </html>
         """)
     
-    # Ensure error_logs table exists
+    # Nothing written since the browser's copy? Skip the queries entirely.
+    etag = await get_dashboard_etag()
+    if refresh:
+        dashboard_cache.invalidate()
+        admin_html_cache.invalidate()
+    elif etag and request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    
+    # Same tag as a page rendered in the last few seconds? Serve that copy.
+    cached_html = admin_html_cache.get(etag) if etag else None
+    if cached_html is not None:
+        return HTMLResponse(cached_html, headers={"ETag": etag, "Cache-Control": "no-cache"})
+    
     try:
-        create_error_logs_table()
+        await asyncio.to_thread(create_error_logs_table)
     except Exception as e:
         print(f"Note: Error logs table setup - {e}")
     
     # Get dashboard data
     try:
-        users = get_all_users_with_status()
-        errors = get_recent_errors(hours=None, limit=500)  # Get all errors, paginated
-        stats = get_stats_summary()
-        positions_review = get_positions_needing_review()
-        users_by_tier = get_users_by_tier()
-        
-        # Generate and return HTML
-        html = generate_admin_html(users, errors, stats, positions_review, users_by_tier)
-        return HTMLResponse(html)
+        # Independent reads - each borrows its own pooled connection in a
+        # worker thread, so wall-clock is the slowest query, not the sum
+        users, errors, stats, positions_review = await asyncio.gather(
+            asyncio.to_thread(get_all_users_with_status),
+            asyncio.to_thread(get_recent_errors),  # Newest page; older pages via /admin/errors.json
+            asyncio.to_thread(get_stats_summary),
+            asyncio.to_thread(get_positions_needing_review),
+        )
+        users_by_tier = get_users_by_tier(users)
+        
+        # Stream the HTML (shell, then rows) instead of building one big string
+        page = iter_admin_html(users, errors, stats, positions_review, users_by_tier)
+        return StreamingResponse(
+            iter_and_cache_html(etag, page) if etag else page,
+            media_type="text/html; charset=utf-8",
+            headers={"ETag": etag, "Cache-Control": "no-cache"} if etag else None
+        )
         
     except Exception as e:
         return HTMLResponse(f"""
@@ -475,6 +525,60 @@ async def admin_dashboard(password: str = ""):
             </html>
         """)
 
+@app.get("/admin/static/admin.css")
+async def admin_dashboard_css():
+    """
+    Dashboard stylesheet
+    
+    The page links it with a content-hash query string, so it can be
+    cached for a year and a new deploy still gets picked up.
+    """
+    return Response(
+        content=ADMIN_CSS,
+        media_type="text/css",
+        headers={"Cache-Control": "public, max-age=31536000, immutable"}
+    )
+
+@app.get("/admin/data.json")
+async def admin_dashboard_data(request: Request, password: str = ""):
+    """
+    Dashboard stats + rendered rows for the Refresh button
+    
+    Lets the page patch itself in place instead of reloading the full HTML.
+    Shares /admin's ETag, so a refresh with nothing new is a 304.
+    """
+    if password != ADMIN_PASSWORD:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    
+    etag = await get_dashboard_etag()
+    if etag and request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    
+    users, errors, stats = await asyncio.gather(
+        asyncio.to_thread(get_all_users_with_status),
+        asyncio.to_thread(get_recent_errors),
+        asyncio.to_thread(get_stats_summary),
+    )
+    
+    return JSONResponse(
+        get_dashboard_data(users, errors, stats),
+        headers={"ETag": etag, "Cache-Control": "no-cache"} if etag else None
+    )
+
+@app.get("/admin/errors.json")
+async def admin_older_errors(password: str = "", before_id: int = 0):
+    """
+    One older page of Error History for the "Load older errors" button
+    
+    Keyset pagination: returns errors with id < before_id plus the cursor
+    for the next page (null once the oldest error has been sent).
+    """
+    if password != ADMIN_PASSWORD:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    
+    errors = await asyncio.to_thread(get_recent_errors, before_id=before_id or None)
+    return JSONResponse(get_error_page_data(errors))
+
 # Database Reset Endpoint (NEW!)
 @app.post("/admin/reset-database")
 async def reset_database(password: str = ""):
@@ -493,58 +597,51 @@ async def reset_database(password: str = ""):
         raise HTTPException(status_code=401, detail="Invalid password")
     
     try:
-        import psycopg2
-        conn = psycopg2.connect(DATABASE_URL)
-        cur = conn.cursor()
-        
-        # Tables to clear (in dependency order - children first, parents last)
-        tables = [
-            'trades',
-            'portfolio_trades',
-            'portfolio_withdrawals',
-            'portfolio_deposits',
-            'error_logs',
-            'agent_logs',
-            'signal_deliveries',
-            'signals',
-            'payments',
-            'follower_users',
-            'portfolio_users',
-            'users',
-            'system_stats'
-        ]
-        
-        deleted_counts = {}
-        
-        # Delete all data from each table
-        for table in tables:
-            try:
-                # Count rows before deletion
-                cur.execute(f"SELECT COUNT(*) FROM {table}")
-                count_before = cur.fetchone()[0]
-                
-                # Delete all rows
-                cur.execute(f"DELETE FROM {table}")
-                
-                deleted_counts[table] = {
-                    'rows_deleted': count_before,
-                    'status': 'success'
-                }
-                
-                print(f"✅ Cleared {table}: {count_before} rows deleted")
-                
-            except Exception as e:
-                deleted_counts[table] = {
-                    'rows_deleted': 0,
-                    'status': 'error',
-                    'error': str(e)[:100]
-                }
-                print(f"⚠️ Error clearing {table}: {str(e)[:100]}")
-        
-        # Commit all deletions
-        conn.commit()
-        cur.close()
-        conn.close()
+        # get_db() commits the deletions when the block finishes
+        with get_db() as conn, conn.cursor() as cur:
+            # Tables to clear (in dependency order - children first, parents last)
+            tables = [
+                'trades',
+                'portfolio_trades',
+                'portfolio_withdrawals',
+                'portfolio_deposits',
+                'error_logs',
+                'agent_logs',
+                'signal_deliveries',
+                'signals',
+                'payments',
+                'follower_users',
+                'portfolio_users',
+                'users',
+                'system_stats'
+            ]
+            
+            deleted_counts = {}
+            
+            # Delete all data from each table
+            for table in tables:
+                try:
+                    # Count rows before deletion
+                    cur.execute(f"SELECT COUNT(*) FROM {table}")
+                    count_before = cur.fetchone()[0]
+                    
+                    # Delete all rows
+                    cur.execute(f"DELETE FROM {table}")
+                    
+                    deleted_counts[table] = {
+                        'rows_deleted': count_before,
+                        'status': 'success'
+                    }
+                    
+                    print(f"✅ Cleared {table}: {count_before} rows deleted")
+                    
+                except Exception as e:
+                    deleted_counts[table] = {
+                        'rows_deleted': 0,
+                        'status': 'error',
+                        'error': str(e)[:100]
+                    }
+                    print(f"⚠️ Error clearing {table}: {str(e)[:100]}")
         
         total_deleted = sum(
             t.get('rows_deleted', 0) 
@@ -584,20 +681,13 @@ async def delete_review_position(
         raise HTTPException(status_code=401, detail="Unauthorized")
     
     try:
-        import psycopg2
-        conn = psycopg2.connect(DATABASE_URL)
-        cur = conn.cursor()
-        
-        # Delete the position
-        cur.execute(
-            "DELETE FROM open_positions WHERE id = %s AND status = 'needs_review'",
-            (position_id,)
-        )
-        
-        rows_deleted = cur.rowcount
-        conn.commit()
-        cur.close()
-        conn.close()
+        with get_db() as conn, conn.cursor() as cur:
+            # Delete the position
+            cur.execute(
+                "DELETE FROM open_positions WHERE id = %s AND status = 'needs_review'",
+                (position_id,)
+            )
+            rows_deleted = cur.rowcount
         
         if rows_deleted == 0:
             raise HTTPException(status_code=404, detail="Position not found or not in review status")
@@ -644,20 +734,13 @@ async def update_user_tier_endpoint(
         if new_tier not in ['team', 'vip', 'standard']:
             raise HTTPException(status_code=400, detail="Invalid tier. Must be: team, vip, or standard")
         
-        import psycopg2
-        conn = psycopg2.connect(DATABASE_URL)
-        cur = conn.cursor()
-        
-        # Update the user's tier
-        cur.execute(
-            "UPDATE follower_users SET fee_tier = %s WHERE id = %s",
-            (new_tier, user_id)
-        )
-        
-        rows_updated = cur.rowcount
-        conn.commit()
-        cur.close()
-        conn.close()
+        with get_db() as conn, conn.cursor() as cur:
+            # Update the user's tier
+            cur.execute(
+                "UPDATE follower_users SET fee_tier = %s WHERE id = %s",
+                (new_tier, user_id)
+            )
+            rows_updated = cur.rowcount
         
         if rows_updated == 0:
             raise HTTPException(status_code=404, detail="User not found")
@@ -670,6 +753,27 @@ async def update_user_tier_endpoint(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/admin/errors/export-csv")
+async def download_error_log_csv(password: str = ""):
+    """
+    Download the full error log as CSV
+    
+    Query params:
+        password: Admin password
+    
+    Streams rows from a server-side cursor instead of building the file in memory
+    """
+    if password != ADMIN_PASSWORD:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    
+    return StreamingResponse(
+        iter_error_log_csv(),
+        media_type="text/csv",
+        headers={
+            "Content-Disposition": "attachment; filename=nike_rocket_error_log.csv"
+        }
+    )
+
 # ==================== TAX REPORTS ENDPOINTS ====================
 
 @app.get("/admin/reports/monthly-csv")
@@ -850,10 +954,9 @@ async def admin_check_billing_cycles(password: str = ""):
         raise HTTPException(status_code=401, detail="Unauthorized")
     
     try:
-        db_pool = await asyncpg.create_pool(DATABASE_URL)
+        db_pool = await get_async_pool()
         billing = BillingServiceV2(db_pool)
         result = await billing.check_all_cycles()
-        await db_pool.close()
         
         return {
             "status": "success",
@@ -871,10 +974,9 @@ async def admin_check_overdue(password: str = ""):
         raise HTTPException(status_code=401, detail="Unauthorized")
     
     try:
-        db_pool = await asyncpg.create_pool(DATABASE_URL)
+        db_pool = await get_async_pool()
         billing = BillingServiceV2(db_pool)
         result = await billing.check_overdue_invoices()
-        await db_pool.close()
         
         return {
             "status": "success",
@@ -904,10 +1006,9 @@ async def admin_verify_billing_accuracy(password: str = "", auto_fix: bool = Fal
         raise HTTPException(status_code=401, detail="Unauthorized")
 
     try:
-        db_pool = await asyncpg.create_pool(DATABASE_URL)
+        db_pool = await get_async_pool()
         billing = BillingServiceV2(db_pool)
         result = await billing.verify_billing_accuracy(auto_fix=auto_fix)
-        await db_pool.close()
 
         return {
             "status": "success" if result["discrepancies_found"] == 0 else "discrepancies_found",
@@ -937,7 +1038,7 @@ async def admin_test_kraken_uid(password: str = "", email: str = ""):
     cipher = Fernet(ENCRYPTION_KEY.encode())
     
     try:
-        db_pool = await asyncpg.create_pool(DATABASE_URL)
+        db_pool = await get_async_pool()
         
         async with db_pool.acquire() as conn:
             # Get user
@@ -1004,7 +1105,6 @@ async def admin_test_kraken_uid(password: str = "", email: str = ""):
             except Exception as e:
                 results["endpoints_tried"]["openpositions"] = {"success": False, "error": str(e)[:100]}
             
-            await db_pool.close()
             return results
             
     except Exception as e:
@@ -1046,7 +1146,7 @@ async def admin_backfill_kraken_ids(password: str = "", force: bool = False):
     }
     
     try:
-        db_pool = await asyncpg.create_pool(DATABASE_URL)
+        db_pool = await get_async_pool()
         
         async with db_pool.acquire() as conn:
             # Get users based on force flag
@@ -1071,7 +1171,6 @@ async def admin_backfill_kraken_ids(password: str = "", force: bool = False):
                 """)
             
             if not users:
-                await db_pool.close()
                 return {
                     "status": "success",
                     "message": "No users need backfilling",
@@ -1180,8 +1279,6 @@ async def admin_backfill_kraken_ids(password: str = "", force: bool = False):
                         "error": str(e)[:100]
                     })
         
-        await db_pool.close()
-        
         return {
             "status": "success",
             "message": f"Backfill complete: {len(results['success'])} success, {len(results['failed'])} failed",
@@ -1207,10 +1304,9 @@ async def admin_billing_summary(password: str = ""):
         raise HTTPException(status_code=401, detail="Unauthorized")
     
     try:
-        db_pool = await asyncpg.create_pool(DATABASE_URL)
+        db_pool = await get_async_pool()
         billing = BillingServiceV2(db_pool)
         summary = await billing.get_billing_summary()
-        await db_pool.close()
         
         return {
             "status": "success",
@@ -1242,10 +1338,9 @@ async def admin_change_user_tier(
         raise HTTPException(status_code=400, detail="Invalid tier. Must be: team, vip, standard")
     
     try:
-        db_pool = await asyncpg.create_pool(DATABASE_URL)
+        db_pool = await get_async_pool()
         billing = BillingServiceV2(db_pool)
         success = await billing.change_user_tier(user_id, tier, immediate)
-        await db_pool.close()
         
         if success:
             return {
@@ -1267,7 +1362,7 @@ async def admin_waive_invoice(user_id: int, password: str = ""):
         raise HTTPException(status_code=401, detail="Unauthorized")
     
     try:
-        db_pool = await asyncpg.create_pool(DATABASE_URL)
+        db_pool = await get_async_pool()
         
         async with db_pool.acquire() as conn:
             # Clear pending invoice
@@ -1281,7 +1376,6 @@ async def admin_waive_invoice(user_id: int, password: str = ""):
             """, user_id)
             
             if result == "UPDATE 0":
-                await db_pool.close()
                 return {
                     "status": "skipped",
                     "message": "No pending invoice for this user"
@@ -1296,8 +1390,6 @@ async def admin_waive_invoice(user_id: int, password: str = ""):
                 ORDER BY id DESC LIMIT 1
             """, user_id)
         
-        await db_pool.close()
-        
         return {
             "status": "success",
             "message": f"Invoice waived for user {user_id}"
@@ -1313,7 +1405,7 @@ async def admin_restore_access(user_id: int, password: str = ""):
         raise HTTPException(status_code=401, detail="Unauthorized")
     
     try:
-        db_pool = await asyncpg.create_pool(DATABASE_URL)
+        db_pool = await get_async_pool()
         billing = BillingServiceV2(db_pool)
         success = await billing.reactivate_after_payment(user_id)
         
@@ -1330,8 +1422,6 @@ async def admin_restore_access(user_id: int, password: str = ""):
                     WHERE id = $1
                 """, user_id)
         
-        await db_pool.close()
-        
         return {
             "status": "success",
             "message": f"Access restored for user {user_id}"
@@ -1347,7 +1437,7 @@ async def admin_get_user_cycles(user_id: int, password: str = ""):
         raise HTTPException(status_code=401, detail="Unauthorized")
     
     try:
-        db_pool = await asyncpg.create_pool(DATABASE_URL)
+        db_pool = await get_async_pool()
         
         async with db_pool.acquire() as conn:
             # Get user info
@@ -1360,7 +1450,6 @@ async def admin_get_user_cycles(user_id: int, password: str = ""):
             """, user_id)
             
             if not user:
-                await db_pool.close()
                 raise HTTPException(status_code=404, detail="User not found")
             
             # Get cycle history
@@ -1376,8 +1465,6 @@ async def admin_get_user_cycles(user_id: int, password: str = ""):
                 LIMIT 20
             """, user_id)
         
-        await db_pool.close()
-        
         return {
             "status": "success",
             "user": {
@@ -1475,10 +1562,6 @@ async def get_open_positions(request: Request):
         raise HTTPException(status_code=401, detail="API key required")
     
     try:
-        DATABASE_URL = os.getenv("DATABASE_URL")
-        if DATABASE_URL and DATABASE_URL.startswith("postgres://"):
-            DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
-        
         conn = await asyncpg.connect(DATABASE_URL)
         
         # First validate the API key and get user_id
@@ -5374,8 +5457,16 @@ async def startup_event():
     # Start balance checker for automatic deposit/withdrawal detection
     # CRITICAL FIX: WITH STARTUP DELAY TO PREVENT RACE CONDITION!
     if DATABASE_URL:
+        # Admin monitoring tables (error_logs, agent_logs) + schema migrations.
+        # Done once here so dashboard reads don't have to probe for them.
         try:
-            db_pool = await asyncpg.create_pool(DATABASE_URL)
+            await asyncio.to_thread(create_error_logs_table)
+            print("✅ Admin monitoring tables ready")
+        except Exception as e:
+            print(f"⚠️ Admin monitoring tables setup failed: {e}")
+        
+        try:
+            db_pool = await get_async_pool()  # Shared pool (db.get_pool)
             _db_pool = db_pool  # Set global for billing endpoints
             
             # ═══════════════════════════════════════════════════════════
@@ -5413,6 +5504,12 @@ async def startup_event():
             asyncio.create_task(start_billing_scheduler_v2(db_pool))
             print("💰 Billing scheduler v2 scheduled (30-day rolling, starts in 60 seconds)")
             
+            # ═══════════════════════════════════════════════════════════
+            # ADMIN ROLL-UPS: Refreshes dashboard materialized views
+            # ═══════════════════════════════════════════════════════════
+            asyncio.create_task(start_admin_rollup_refresher())
+            print("📈 Admin roll-up refresher scheduled (every 60 seconds)")
+            
         except Exception as e:
             print(f"⚠️ Background tasks failed to start: {e}")
     
@@ -15,8 +15,13 @@ import json
 from cryptography.fernet import Fernet
 from typing import Optional, Dict
 
+from db import get_database_url
+
 router = APIRouter()
 
+# Normalized once (Railway hands out postgres://, asyncpg wants postgresql://)
+DATABASE_URL = get_database_url()
+
 # Setup encryption
 ENCRYPTION_KEY = os.getenv("CREDENTIALS_ENCRYPTION_KEY")
 if ENCRYPTION_KEY:
@@ -28,10 +33,6 @@ else:
 async def log_error_async(api_key: str, error_type: str, error_message: str, context: Optional[Dict] = None):
     """Log error to error_logs table for admin dashboard visibility"""
     try:
-        DATABASE_URL = os.getenv("DATABASE_URL")
-        if DATABASE_URL and DATABASE_URL.startswith("postgres://"):
-            DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
-        
         conn = await asyncpg.connect(DATABASE_URL)
         await conn.execute(
             """INSERT INTO error_logs (api_key, error_type, error_message, context) 
@@ -49,10 +50,6 @@ async def log_error_async(api_key: str, error_type: str, error_message: str, con
 
 async def validate_api_key(api_key: str, db_pool=None) -> dict:
     """Validate API key exists in database. Returns user dict or raises HTTPException."""
-    DATABASE_URL = os.getenv("DATABASE_URL")
-    if DATABASE_URL and DATABASE_URL.startswith("postgres://"):
-        DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
-    
     close_pool = False
     if db_pool is None:
         db_pool = await asyncpg.create_pool(DATABASE_URL)
@@ -91,10 +88,6 @@ def decrypt_credentials(encrypted_key: str, encrypted_secret: str) -> tuple:
 async def get_kraken_credentials(api_key: str):
     """Get user's Kraken API credentials from database"""
     try:
-        DATABASE_URL = os.getenv("DATABASE_URL")
-        if DATABASE_URL and DATABASE_URL.startswith("postgres://"):
-            DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
-        
         conn = await asyncpg.connect(DATABASE_URL)
         
         user = await conn.fetchrow("""
@@ -210,10 +203,6 @@ async def initialize_portfolio_autodetect(request: Request):
         raise HTTPException(status_code=401, detail="API key required")
     
     try:
-        DATABASE_URL = os.getenv("DATABASE_URL")
-        if DATABASE_URL and DATABASE_URL.startswith("postgres://"):
-            DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
-        
         conn = await asyncpg.connect(DATABASE_URL)
         
         credentials = await get_kraken_credentials(api_key)
@@ -347,10 +336,6 @@ async def get_balance_summary(request: Request):
     try:
         from balance_checker import BalanceChecker
         
-        DATABASE_URL = os.getenv("DATABASE_URL")
-        if DATABASE_URL and DATABASE_URL.startswith("postgres://"):
-            DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
-        
         db_pool = await asyncpg.create_pool(DATABASE_URL)
         
         # First validate the API key exists
@@ -435,10 +420,6 @@ async def get_transactions(request: Request):
     try:
         from balance_checker import BalanceChecker
         
-        DATABASE_URL = os.getenv("DATABASE_URL")
-        if DATABASE_URL and DATABASE_URL.startswith("postgres://"):
-            DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
-        
         db_pool = await asyncpg.create_pool(DATABASE_URL)
         
         # Validate API key exists
@@ -526,10 +507,6 @@ async def get_portfolio_stats(request: Request, period: str = "30d"):
         
         from balance_checker import BalanceChecker
         
-        DATABASE_URL = os.getenv("DATABASE_URL")
-        if DATABASE_URL and DATABASE_URL.startswith("postgres://"):
-            DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
-        
         db_pool = await asyncpg.create_pool(DATABASE_URL)
         checker = BalanceChecker(db_pool)
         summary = await checker.get_balance_summary(api_key)
@@ -928,10 +905,6 @@ async def get_equity_curve(request: Request):
         
         from balance_checker import BalanceChecker
         
-        DATABASE_URL = os.getenv("DATABASE_URL")
-        if DATABASE_URL and DATABASE_URL.startswith("postgres://"):
-            DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
-        
         # Get initial capital from balance summary
         db_pool = await asyncpg.create_pool(DATABASE_URL)
         checker = BalanceChecker(db_pool)
@@ -1078,10 +1051,6 @@ async def export_monthly_trades(request: Request, key: str, year: int, month: in
     - Individual trade details
     - Net P&L summary at bottom
     """
-    DATABASE_URL = os.getenv("DATABASE_URL")
-    if DATABASE_URL and DATABASE_URL.startswith("postgres://"):
-        DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
-    
     try:
         conn = await asyncpg.connect(DATABASE_URL)
         
@@ -1214,10 +1183,6 @@ async def export_yearly_trades(request: Request, key: str, year: int):
     - Monthly breakdown
     - Yearly summary
     """
-    DATABASE_URL = os.getenv("DATABASE_URL")
-    if DATABASE_URL and DATABASE_URL.startswith("postgres://"):
-        DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
-    
     try:
         conn = await asyncpg.connect(DATABASE_URL)
         
@@ -22,18 +22,13 @@ Created: November 25, 2025
 Updated: November 29, 2025 - Changed to only report actually received payments
 """
 
-import os
-import psycopg2
 from datetime import datetime, timedelta
 from typing import List, Dict
 import csv
 import io
 
-DATABASE_URL = os.getenv("DATABASE_URL")
-
-
-def get_db_connection():
-    return psycopg2.connect(DATABASE_URL)
+# Pooled connections (commit/rollback and return-to-pool even on errors)
+from admin_dashboard import get_db
 
 
 def get_monthly_income(year: int, month: int) -> Dict:
@@ -44,28 +39,26 @@ def get_monthly_income(year: int, month: int) -> Dict:
     This ensures we only report income actually received, not pending/unpaid fees.
     """
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
-        # Get paid invoices for this month
-        cur.execute("""
-            SELECT 
-                bi.user_id,
-                fu.email,
-                bi.amount_usd as fee_paid,
-                bi.profit_amount as user_profit,
-                bi.paid_at,
-                bi.coinbase_charge_id
-            FROM billing_invoices bi
-            JOIN follower_users fu ON fu.id = bi.user_id
-            WHERE 
-                bi.status = 'paid'
-                AND EXTRACT(YEAR FROM bi.paid_at) = %s
-                AND EXTRACT(MONTH FROM bi.paid_at) = %s
-            ORDER BY fu.email, bi.paid_at
-        """, (year, month))
-        
-        invoices = cur.fetchall()
+        with get_db() as conn, conn.cursor() as cur:
+            # Get paid invoices for this month
+            cur.execute("""
+                SELECT 
+                    bi.user_id,
+                    fu.email,
+                    bi.amount_usd as fee_paid,
+                    bi.profit_amount as user_profit,
+                    bi.paid_at,
+                    bi.coinbase_charge_id
+                FROM billing_invoices bi
+                JOIN follower_users fu ON fu.id = bi.user_id
+                WHERE 
+                    bi.status = 'paid'
+                    AND EXTRACT(YEAR FROM bi.paid_at) = %s
+                    AND EXTRACT(MONTH FROM bi.paid_at) = %s
+                ORDER BY fu.email, bi.paid_at
+            """, (year, month))
+            
+            invoices = cur.fetchall()
         
         total_fees = 0.0
         total_profit = 0.0
@@ -106,9 +99,6 @@ def get_monthly_income(year: int, month: int) -> Dict:
                 'fee_rate': data['fee_rate']
             })
         
-        cur.close()
-        conn.close()
-        
         return {
             'year': year,
             'month': month,
@@ -185,30 +175,30 @@ def get_user_fees(start_date: str, end_date: str) -> List[Dict]:
     Returns list of users with their total fees actually received
     """
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
-        cur.execute("""
-            SELECT 
-                fu.email,
-                fu.api_key,
-                fu.fee_tier,
-                COUNT(bi.id) as payment_count,
-                SUM(bi.profit_amount) as total_profit,
-                SUM(bi.amount_usd) as total_fees_paid,
-                MIN(bi.paid_at) as first_payment,
-                MAX(bi.paid_at) as last_payment
-            FROM billing_invoices bi
-            JOIN follower_users fu ON fu.id = bi.user_id
-            WHERE 
-                bi.status = 'paid'
-                AND bi.paid_at BETWEEN %s AND %s
-            GROUP BY fu.id, fu.email, fu.api_key, fu.fee_tier
-            ORDER BY total_fees_paid DESC
-        """, (start_date, end_date))
+        with get_db() as conn, conn.cursor() as cur:
+            cur.execute("""
+                SELECT 
+                    fu.email,
+                    fu.api_key,
+                    fu.fee_tier,
+                    COUNT(bi.id) as payment_count,
+                    SUM(bi.profit_amount) as total_profit,
+                    SUM(bi.amount_usd) as total_fees_paid,
+                    MIN(bi.paid_at) as first_payment,
+                    MAX(bi.paid_at) as last_payment
+                FROM billing_invoices bi
+                JOIN follower_users fu ON fu.id = bi.user_id
+                WHERE 
+                    bi.status = 'paid'
+                    AND bi.paid_at BETWEEN %s AND %s
+                GROUP BY fu.id, fu.email, fu.api_key, fu.fee_tier
+                ORDER BY total_fees_paid DESC
+            """, (start_date, end_date))
+            
+            rows = cur.fetchall()
         
         users = []
-        for row in cur.fetchall():
+        for row in rows:
             email, api_key, fee_tier, payment_count, total_profit, total_fees, first_payment, last_payment = row
             
             # Determine fee rate from tier
@@ -231,9 +221,6 @@ def get_user_fees(start_date: str, end_date: str) -> List[Dict]:
                 'avg_fee_per_payment': float(total_fees or 0) / payment_count if payment_count > 0 else 0
             })
         
-        cur.close()
-        conn.close()
-        
         return users
         
     except Exception as e:
@@ -244,18 +231,14 @@ def get_user_fees(start_date: str, end_date: str) -> List[Dict]:
 def get_earliest_payment_year() -> int:
     """Get the year of the earliest paid invoice"""
     try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        
-        cur.execute("""
-            SELECT MIN(EXTRACT(YEAR FROM paid_at))
-            FROM billing_invoices
-            WHERE status = 'paid' AND paid_at IS NOT NULL
-        """)
-        
-        result = cur.fetchone()
-        cur.close()
-        conn.close()
+        with get_db() as conn, conn.cursor() as cur:
+            cur.execute("""
+                SELECT MIN(EXTRACT(YEAR FROM paid_at))
+                FROM billing_invoices
+                WHERE status = 'paid' AND paid_at IS NOT NULL
+            """)
+            
+            result = cur.fetchone()
         
         if result and result[0]:
             return int(result[0])
@@ -0,0 +1,668 @@
+"""
+Nike Rocket Admin Dashboard Tests
+=================================
+
+Unit tests for admin dashboard helpers that don't need a database.
+
+Run with: pytest tests/test_admin_dashboard.py -v
+
+Author: Nike Rocket Team
+"""
+
+import os
+import time
+import pytest
+import threading
+from unittest.mock import patch, AsyncMock, MagicMock
+
+# Add parent directory to path for imports
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import admin_dashboard
+from admin_dashboard import DashboardCache
+
+
+# =============================================================================
+# TEST FIXTURES
+# =============================================================================
+
+@pytest.fixture(autouse=True)
+def clear_dashboard_cache():
+    """Make sure cached results never leak between tests"""
+    admin_dashboard.dashboard_cache.invalidate()
+    admin_dashboard.schema_cache.invalidate()
+    yield
+    admin_dashboard.dashboard_cache.invalidate()
+    admin_dashboard.schema_cache.invalidate()
+
+
+# =============================================================================
+# DASHBOARD CACHE TESTS
+# =============================================================================
+
+class TestDashboardCache:
+    """Test the in-process TTL cache used for dashboard reads"""
+    
+    def test_returns_value_within_ttl(self):
+        """A fresh entry is served from cache"""
+        cache = DashboardCache(ttl_seconds=30)
+        cache.set('stats', {'total_users': 3})
+        
+        assert cache.get('stats') == {'total_users': 3}
+    
+    def test_expired_entry_is_dropped(self):
+        """Entries older than the TTL are treated as a miss"""
+        cache = DashboardCache(ttl_seconds=30)
+        
+        with patch('admin_dashboard.time.time', return_value=1000.0):
+            cache.set('stats', {'total_users': 3})
+        with patch('admin_dashboard.time.time', return_value=1031.0):
+            assert cache.get('stats') is None
+        
+        assert 'stats' not in cache.cache
+    
+    def test_invalidate_single_key(self):
+        """Invalidating one key leaves the others alone"""
+        cache = DashboardCache()
+        cache.set('stats', {})
+        cache.set('users', [])
+        
+        cache.invalidate('stats')
+        
+        assert cache.get('stats') is None
+        assert cache.get('users') == []
+    
+    def test_invalidate_all(self):
+        """Invalidating with no key clears everything"""
+        cache = DashboardCache()
+        cache.set('stats', {})
+        cache.set('users', [])
+        
+        cache.invalidate()
+        
+        assert cache.cache == {}
+    
+    def test_stats_summary_served_from_cache(self):
+        """get_stats_summary skips the database on a cache hit"""
+        admin_dashboard.dashboard_cache.set('stats', {'total_users': 7})
+        
+        with patch('admin_dashboard.get_db') as get_db:
+            assert admin_dashboard.get_stats_summary() == {'total_users': 7}
+            get_db.assert_not_called()
+
+    def test_older_error_pages_bypass_cache(self):
+        """Client-supplied cursors never add cache entries or load locks"""
+        locks_before = set(admin_dashboard.dashboard_cache._load_locks)
+        with patch('admin_dashboard._load_recent_errors', return_value=[{'id': 1}]):
+            assert admin_dashboard.get_recent_errors(before_id=42) == [{'id': 1}]
+
+        assert admin_dashboard.dashboard_cache.cache == {}
+        assert set(admin_dashboard.dashboard_cache._load_locks) == locks_before
+
+    def test_concurrent_misses_load_once(self):
+        """Callers that miss together share one loader call"""
+        cache = admin_dashboard.DashboardCache(ttl_seconds=30)
+        calls = []
+        
+        def loader():
+            calls.append(1)
+            time.sleep(0.05)
+            return ['row']
+        
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get_or_load('errors', loader)))
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        assert calls == [1]
+        assert results == [['row']] * 4
+    
+    def test_failed_load_is_not_cached(self):
+        """A loader returning None leaves the key empty for the next caller"""
+        cache = admin_dashboard.DashboardCache(ttl_seconds=30)
+        
+        assert cache.get_or_load('users', lambda: None) is None
+        assert cache.get_or_load('users', lambda: []) == []
+        assert cache.get('users') == []
+
+
+# =============================================================================
+# PREPARED STATEMENT TESTS
+# =============================================================================
+
+class FakeCursor:
+    """Cursor stub that records executed SQL"""
+    
+    def __init__(self):
+        self.connection = type('FakeConnection', (), {'prepared_statements': set()})()
+        self.executed = []
+    
+    def execute(self, sql, params=None):
+        self.executed.append((sql, params))
+
+
+class TestReadonlyConnection:
+    """Test get_db's autocommit mode for single-statement reads"""
+
+    def test_readonly_skips_transaction_and_resets(self):
+        """Reads run in autocommit and hand the connection back transactional"""
+        conn = MagicMock(closed=0, autocommit=False)
+        with patch('admin_dashboard.get_pool') as get_pool:
+            get_pool.return_value.getconn.return_value = conn
+            with admin_dashboard.get_db(readonly=True) as borrowed:
+                assert borrowed.autocommit is True
+
+        conn.__enter__.assert_not_called()
+        assert conn.autocommit is False
+        get_pool.return_value.putconn.assert_called_once_with(conn, close=False)
+
+
+class TestExecutePrepared:
+    """Test PREPARE-once / EXECUTE-by-name helper"""
+    
+    def test_prepares_once_per_connection(self):
+        """Second call on the same connection only sends EXECUTE"""
+        cur = FakeCursor()
+        sql = "SELECT * FROM error_logs LIMIT $1"
+        
+        admin_dashboard.execute_prepared(cur, sql, (500,))
+        admin_dashboard.execute_prepared(cur, sql, (100,))
+        
+        statements = [executed[0] for executed in cur.executed]
+        assert len(statements) == 3
+        assert statements[0].startswith("PREPARE admin_")
+        assert statements[1] == statements[2]
+        assert statements[1].startswith("EXECUTE admin_")
+        assert cur.executed[2][1] == (100,)
+    
+    def test_execute_without_params(self):
+        """Parameterless statements are executed without an argument list"""
+        cur = FakeCursor()
+        
+        admin_dashboard.execute_prepared(cur, "SELECT COUNT(*) FROM follower_users")
+        
+        sql, params = cur.executed[-1]
+        assert "(" not in sql
+        assert params is None
+
+
+class TestStatsSummary:
+    """Test the single-statement stats summary"""
+    
+    def test_legacy_schema_in_one_round_trip(self):
+        """Legacy totals and the error count come back from one statement"""
+        cur = FakeCursor()
+        cur.fetchone = lambda: (4, 3, 2, 50, 10, 1000, None, 5)
+        conn = MagicMock()
+        conn.cursor.return_value.__enter__.return_value = cur
+        
+        with patch('admin_dashboard.prefetch_schema'), \
+             patch('admin_dashboard.table_exists', return_value=True), \
+             patch('admin_dashboard.error_logs_ready', return_value=True), \
+             patch('admin_dashboard.matview_exists', return_value=False), \
+             patch('admin_dashboard.get_table_columns', return_value=['credentials_set']), \
+             patch('admin_dashboard.get_db') as get_db:
+            get_db.return_value.__enter__.return_value = conn
+            stats = admin_dashboard.get_stats_summary()
+        
+        executes = [sql for sql, _ in cur.executed if sql.startswith("EXECUTE")]
+        assert len(executes) == 1
+        prepared = cur.executed[0][0]
+        assert "FROM portfolio_users" in prepared
+        assert "FROM error_logs" in prepared
+        assert stats['platform_capital'] == 1000.0
+        assert stats['current_value'] == 1050.0  # No AUM column: capital + profit
+        assert stats['errors_1h'] == 5
+
+    def test_failed_query_is_not_cached(self):
+        """A failed stats query shows zeros but leaves the cache empty"""
+        with patch('admin_dashboard.prefetch_schema'), \
+             patch('admin_dashboard.table_exists', return_value=True), \
+             patch('admin_dashboard.error_logs_ready', return_value=True), \
+             patch('admin_dashboard.matview_exists', return_value=False), \
+             patch('admin_dashboard.get_table_columns', return_value=['credentials_set']), \
+             patch('admin_dashboard.get_db', side_effect=Exception("db down")):
+            stats = admin_dashboard.get_stats_summary()
+
+        assert stats['total_users'] == 0
+        assert stats['platform_roi'] == 0.0
+        assert admin_dashboard.dashboard_cache.get('stats') is None
+
+
+# =============================================================================
+# BATCHED ERROR LOGGING TESTS
+# =============================================================================
+
+class TestBatchedErrorLogging:
+    """Test that log_error queues rows and flushes them in one batch"""
+    
+    @pytest.fixture(autouse=True)
+    def no_writer_thread(self):
+        """Keep the background writer out of the way and start with an empty queue"""
+        with patch('admin_dashboard._ensure_error_log_writer'):
+            while not admin_dashboard._error_log_queue.empty():
+                admin_dashboard._error_log_queue.get_nowait()
+            yield
+    
+    def test_flush_writes_queued_rows_in_one_batch(self):
+        """Several log_error calls become a single INSERT"""
+        with patch('admin_dashboard._insert_error_rows') as insert:
+            admin_dashboard.log_error('key1', 'trade_failed', 'boom')
+            admin_dashboard.log_error('key2', 'api_error', 'bang', {'symbol': 'BTC'})
+            insert.assert_not_called()
+            
+            admin_dashboard.flush_error_logs()
+        
+        insert.assert_called_once()
+        rows = insert.call_args[0][0]
+        assert rows[0] == ('key1', 'trade_failed', 'boom', None)
+        assert rows[1][:3] == ('key2', 'api_error', 'bang')
+        context = rows[1][3]
+        assert context.dumps(context.adapted) == '{"symbol":"BTC"}'
+        assert len(rows) == 2
+    
+    def test_failed_batch_only_drops_bad_rows(self):
+        """A batch INSERT that fails is retried row by row"""
+        written = []
+        
+        def insert(rows):
+            if len(rows) > 1 or rows[0][1] == 'x' * 200:
+                raise Exception("value too long for type character varying(100)")
+            written.extend(rows)
+        
+        with patch('admin_dashboard._insert_error_rows', side_effect=insert):
+            admin_dashboard.log_error('key1', 'trade_failed', 'boom')
+            admin_dashboard.log_error('key2', 'x' * 200, 'bad')
+            admin_dashboard.log_error('key3', 'api_error', 'bang')
+            admin_dashboard.flush_error_logs()
+        
+        assert [row[0] for row in written] == ['key1', 'key3']
+    
+    def test_context_is_captured_when_queued(self):
+        """Changing the dict after logging doesn't change the queued row"""
+        context = {'symbol': 'BTC'}
+        with patch('admin_dashboard._insert_error_rows') as insert:
+            admin_dashboard.log_error('key1', 'api_error', 'bang', context)
+            context['symbol'] = 'ETH'
+            context['extra'] = 1
+            admin_dashboard.flush_error_logs()
+        
+        queued = insert.call_args[0][0][0][3]
+        assert queued.dumps(queued.adapted) == '{"symbol":"BTC"}'
+    
+    def test_context_is_compact_and_tolerant(self):
+        """Context JSON has no padding and non-JSON values are stringified"""
+        from datetime import datetime
+        
+        payload = admin_dashboard.dump_json({'at': datetime(2024, 1, 1), 'qty': 2})
+        
+        assert payload == '{"at":"2024-01-01 00:00:00","qty":2}'
+    
+    def test_full_queue_falls_back_to_direct_write(self):
+        """When the queue is full the row is written immediately"""
+        full_queue = admin_dashboard.queue.Queue(maxsize=1)
+        full_queue.put_nowait(('old', 'x', 'y', None))
+        
+        with patch('admin_dashboard._error_log_queue', full_queue), \
+             patch('admin_dashboard._insert_error_rows') as insert:
+            admin_dashboard.log_error('key1', 'trade_failed', 'boom')
+        
+        insert.assert_called_once_with([('key1', 'trade_failed', 'boom', None)])
+    
+    def test_agent_events_share_the_batch(self):
+        """Agent events are queued too and written with their own INSERT"""
+        with patch('admin_dashboard._insert_error_rows') as insert_errors, \
+             patch('admin_dashboard._insert_agent_rows') as insert_events:
+            admin_dashboard.log_agent_event('key1', 'heartbeat')
+            admin_dashboard.log_error('key1', 'trade_failed', 'boom')
+            admin_dashboard.log_agent_event('key2', 'trade_executed', {'qty': 1})
+            
+            admin_dashboard.flush_error_logs()
+        
+        insert_errors.assert_called_once_with([('key1', 'trade_failed', 'boom', None)])
+        events = insert_events.call_args[0][0]
+        assert events[0] == ('key1', 'heartbeat', None)
+        assert events[1][:2] == ('key2', 'trade_executed')
+        event_data = events[1][2]
+        assert event_data.dumps(event_data.adapted) == '{"qty":1}'
+        assert len(events) == 2
+
+
+# =============================================================================
+# SCHEMA PROBE TESTS
+# =============================================================================
+
+class TestSchemaCache:
+    """Test that schema probes are answered from cache within the TTL"""
+    
+    def test_table_exists_is_cached(self):
+        """A second probe for the same table doesn't touch the database"""
+        with patch('admin_dashboard.get_db') as get_db:
+            cur = get_db.return_value.__enter__.return_value.cursor.return_value.__enter__.return_value
+            cur.fetchone.return_value = (True,)
+            
+            assert admin_dashboard.table_exists('follower_users') is True
+            assert admin_dashboard.table_exists('follower_users') is True
+        
+        assert get_db.call_count == 1
+    
+    def test_failed_probe_is_not_cached(self):
+        """Errors fall back to 'missing' without poisoning the cache"""
+        with patch('admin_dashboard.get_db', side_effect=Exception("db down")):
+            assert admin_dashboard.get_table_columns('follower_users') == []
+        
+        assert admin_dashboard.schema_cache.get('columns:follower_users') is None
+
+    def test_prefetch_answers_later_probes(self):
+        """One catalog query warms table, column and view probes"""
+        with patch('admin_dashboard.get_db') as get_db:
+            cur = get_db.return_value.__enter__.return_value.cursor.return_value.__enter__.return_value
+            cur.fetchall.return_value = [
+                ('follower_users', True, False, ['id', 'email']),
+                ('portfolio_users', False, False, []),
+                ('mv_admin_error_rollup', True, True, ['api_key']),
+            ]
+
+            admin_dashboard.prefetch_schema(('follower_users', 'portfolio_users'), ('mv_admin_error_rollup',))
+            admin_dashboard.prefetch_schema(('follower_users', 'portfolio_users'), ('mv_admin_error_rollup',))
+
+            assert admin_dashboard.table_exists('follower_users') is True
+            assert admin_dashboard.table_exists('portfolio_users') is False
+            assert admin_dashboard.get_table_columns('follower_users') == ['id', 'email']
+            assert admin_dashboard.matview_exists('mv_admin_error_rollup') is True
+
+        assert get_db.call_count == 1
+
+
+class TestErrorLogsReady:
+    """Test that a positive error_logs existence check is remembered"""
+    
+    def test_positive_check_is_cached(self):
+        """Once error_logs is seen, the catalog is not queried again"""
+        with patch('admin_dashboard._error_logs_ready', False), \
+             patch('admin_dashboard.get_db') as get_db:
+            cur = get_db.return_value.__enter__.return_value.cursor.return_value.__enter__.return_value
+            cur.fetchone.return_value = (True,)
+            
+            assert admin_dashboard.error_logs_ready() is True
+            assert admin_dashboard.error_logs_ready() is True
+        
+        assert get_db.call_count == 1
+    
+    def test_missing_table_is_rechecked(self):
+        """A missing table is not cached, so it is picked up once created"""
+        with patch('admin_dashboard._error_logs_ready', False), \
+             patch('admin_dashboard.get_db') as get_db:
+            cur = get_db.return_value.__enter__.return_value.cursor.return_value.__enter__.return_value
+            cur.fetchone.return_value = (False,)
+            
+            assert admin_dashboard.error_logs_ready() is False
+            assert admin_dashboard.error_logs_ready() is False
+        
+        assert get_db.call_count == 2
+
+    def test_schema_setup_runs_once(self):
+        """Tables and indexes go out in one statement, and only on the first call"""
+        with patch('admin_dashboard._error_logs_ready', False), \
+             patch('admin_dashboard._schema_initialized', False), \
+             patch('admin_dashboard.create_concurrent_indexes'), \
+             patch('admin_dashboard.get_db') as get_db:
+            cur = get_db.return_value.__enter__.return_value.cursor.return_value.__enter__.return_value
+
+            admin_dashboard.create_error_logs_table()
+            admin_dashboard.create_error_logs_table()
+
+            assert admin_dashboard.error_logs_ready() is True
+
+        assert get_db.call_count == 1
+        ddl = cur.execute.call_args_list[0][0][0]
+        assert 'CREATE TABLE IF NOT EXISTS agent_logs' in ddl
+        assert 'idx_error_logs_key_ts' in ddl
+
+
+# =============================================================================
+# USER STATUS TESTS
+# =============================================================================
+
+class TestUserStatus:
+    """Test the (agent_active, credentials_set) status lookup"""
+    
+    def test_active_agent_wins(self):
+        """An active agent is Active whether or not credentials are flagged"""
+        assert admin_dashboard.USER_STATUS[(True, True)][0] == 'active'
+        assert admin_dashboard.USER_STATUS[(True, False)][0] == 'active'
+    
+    def test_configured_and_pending(self):
+        """Credentials without a running agent are Ready, otherwise Pending"""
+        assert admin_dashboard.USER_STATUS[(False, True)] == ('configured', 'Ready', '🟡')
+        assert admin_dashboard.USER_STATUS[(False, False)] == ('pending', 'Pending', '⏳')
+    
+    def test_users_get_status_fields(self):
+        """get_all_users_with_status fills status fields from the lookup"""
+        rows = [{'email': 'a@b.c', 'agent_active': None, 'credentials_set': True}]
+        
+        with patch('admin_dashboard.table_exists', return_value=True), \
+             patch('admin_dashboard.get_table_columns', return_value=[]), \
+             patch('admin_dashboard.error_logs_ready', return_value=False), \
+             patch('admin_dashboard.get_db') as get_db:
+            cur = get_db.return_value.__enter__.return_value.cursor.return_value.__enter__.return_value
+            cur.__iter__.return_value = iter([(row,) for row in rows])
+            
+            users = admin_dashboard.get_all_users_with_status()
+        
+        assert users == [{
+            'email': 'a@b.c',
+            'agent_status': 'configured',
+            'status_text': 'Ready',
+            'status_emoji': '🟡',
+        }]
+
+
+# =============================================================================
+# DASHBOARD ETAG TESTS
+# =============================================================================
+
+class TestDashboardEtag:
+    """Test the write-counter ETag used for 304 responses"""
+    
+    async def _etag_for(self, counter):
+        conn = AsyncMock()
+        conn.fetchval.return_value = counter
+        pool = MagicMock()
+        pool.acquire.return_value.__aenter__.return_value = conn
+        with patch('admin_dashboard.get_async_pool', AsyncMock(return_value=pool)), \
+             patch('admin_dashboard._admin_writes', self.admin_writes):
+            return await admin_dashboard.get_dashboard_etag()
+    
+    admin_writes = 0
+    
+    async def test_unchanged_counters_keep_cache(self):
+        """Same counters give the same tag and keep cached results"""
+        first = await self._etag_for(42)
+        admin_dashboard.dashboard_cache.set('stats', {'total_users': 1})
+        
+        assert await self._etag_for(42) == first == 'W/"42-0"'
+        assert admin_dashboard.dashboard_cache.get('stats') == {'total_users': 1}
+    
+    async def test_new_writes_drop_cache(self):
+        """A moved counter changes the tag and invalidates cached results"""
+        await self._etag_for(42)
+        admin_dashboard.dashboard_cache.set('stats', {'total_users': 1})
+        
+        assert await self._etag_for(43) == 'W/"43-0"'
+        assert admin_dashboard.dashboard_cache.get('stats') is None
+    
+    async def test_admin_write_moves_tag_before_counters_flush(self):
+        """An admin write changes the tag even while pg_stat still lags"""
+        first = await self._etag_for(42)
+        with patch('admin_dashboard._admin_writes', 0):
+            admin_dashboard.note_dashboard_write()
+            self.admin_writes = admin_dashboard._admin_writes
+        
+        assert await self._etag_for(42) != first
+    
+    def test_admin_write_drops_cached_page(self):
+        """A page rendered before an admin write is never served after it"""
+        admin_dashboard.admin_html_cache.set('W/"42-0"', "<html>old</html>")
+        with patch('admin_dashboard._admin_writes', 0):
+            admin_dashboard.note_dashboard_write()
+        
+        assert admin_dashboard.admin_html_cache.get('W/"42-0"') is None
+    
+    async def test_probe_failure_returns_none(self):
+        """If the probe fails the caller just renders normally"""
+        with patch('admin_dashboard.get_async_pool', AsyncMock(side_effect=Exception("db down"))):
+            assert await admin_dashboard.get_dashboard_etag() is None
+
+
+# =============================================================================
+# IN-PLACE REFRESH TESTS
+# =============================================================================
+
+class TestDashboardData:
+    """Test the JSON payload used by the Refresh button"""
+    
+    def test_fragments_match_page_ids(self):
+        """Fragments fit the elements refreshDashboard() patches"""
+        users = [{
+            'agent_status': 'active', 'status_emoji': '🟢', 'status_text': 'Active',
+            'email': 'a@b.c', 'api_key_short': 'nk_abcdefghijkl', 'capital': 100.0,
+            'total_trades': 3, 'total_profit': 5.0, 'roi': 5.0, 'recent_errors': 0,
+        }]
+        stats = {'total_users': 1, 'total_profit': 5.0}
+        
+        data = admin_dashboard.get_dashboard_data(users, [], stats)
+        page = admin_dashboard.generate_admin_html(users, [], stats)
+        
+        assert data['total_users'] == 1
+        assert 'id="statsGrid"' in data['stats_html']
+        assert data['stats_html'] in page
+        assert data['user_rows_html'] in page
+        assert 'No errors recorded' in data['error_items_html']
+        for element_id in ('dashboardTimestamp', 'usersBody', 'errorItems'):
+            assert f'id="{element_id}"' in page
+    
+    def test_page_links_versioned_stylesheet(self):
+        """CSS is linked by content hash instead of inlined"""
+        page = admin_dashboard.generate_admin_html([], [], {})
+        
+        assert '<style>' not in page.split('</head>')[0]
+        assert f'/admin/static/admin.css?v={admin_dashboard.ADMIN_CSS_VERSION}' in page
+        assert '.error-item' in admin_dashboard.ADMIN_CSS
+
+    def test_rows_stream_in_batches(self):
+        """Row chunks are grouped so each write carries several rows"""
+        rows = (f"<tr>{i}</tr>" for i in range(5))
+
+        assert list(admin_dashboard._in_batches(rows, size=2)) == [
+            "<tr>0</tr><tr>1</tr>", "<tr>2</tr><tr>3</tr>", "<tr>4</tr>"
+        ]
+
+    def test_streamed_page_is_cached_once_complete(self):
+        """The rendered page is reusable only after every chunk was sent"""
+        admin_dashboard.admin_html_cache.invalidate()
+        chunks = admin_dashboard.iter_and_cache_html('W/"7"', iter(['<html>', '</html>']))
+
+        assert next(chunks) == '<html>'
+        assert admin_dashboard.admin_html_cache.get('W/"7"') is None
+        assert list(chunks) == ['</html>']
+        assert admin_dashboard.admin_html_cache.get('W/"7"') == '<html></html>'
+
+    def test_user_controlled_fields_are_escaped(self):
+        """Emails, error types and API keys can't inject markup"""
+        users = [{
+            'agent_status': 'pending', 'status_emoji': '⏳', 'status_text': 'Pending',
+            'email': '<script>x</script>@b.c', 'api_key_short': 'nk_"><img>', 'capital': 0,
+            'total_trades': 0, 'total_profit': 0, 'roi': 0, 'recent_errors': 0,
+        }]
+        errors = [{'error_type': '<b>boom</b>', 'error_message': 'm', 'api_key': 'k<i>', 'email': 'e'}]
+        
+        page = admin_dashboard.generate_admin_html(users, errors, {'total_users': 1})
+        body = page.split('<script>')[0]
+        
+        assert '<script>x' not in body
+        assert '&lt;script&gt;x&lt;/script&gt;@b.c' in body
+        assert '<b>boom' not in body
+        assert '<img>' not in body and '<i>' not in body
+    
+    def test_older_errors_cursor(self):
+        """A full page hands out its last id; a short page ends the history"""
+        size = admin_dashboard.ERRORS_PAGE_SIZE
+        full_page = [{'id': size - i, 'error_type': 'x', 'error_message': 'y'} for i in range(size)]
+        
+        assert admin_dashboard.get_error_page_data(full_page)['before_id'] == 1
+        assert admin_dashboard.get_error_page_data(full_page[:3])['before_id'] is None
+        assert admin_dashboard.get_error_page_data([]) == {'error_items_html': '', 'before_id': None}
+    
+    def test_older_errors_use_keyset(self):
+        """before_id becomes an id bound, not an OFFSET"""
+        cur = FakeCursor()
+        cur.fetchall = lambda: []
+        conn = MagicMock()
+        conn.cursor.return_value.__enter__.return_value = cur
+        
+        with patch('admin_dashboard.error_logs_ready', return_value=True), \
+             patch('admin_dashboard.get_db') as get_db:
+            get_db.return_value.__enter__.return_value = conn
+            admin_dashboard.get_recent_errors(hours=24, before_id=900)
+        
+        prepared = cur.executed[0][0]
+        assert "el.id < $2" in prepared
+        assert "OFFSET" not in prepared
+        assert cur.executed[-1][1] == (24, 900, admin_dashboard.ERRORS_PAGE_SIZE)
+
+    def test_sql_category_picks_the_style(self):
+        """A category computed by the errors query is used as-is"""
+        error = {'error_type': 'timeout', 'error_message': '', 'category': 'funds'}
+        html_out = admin_dashboard.get_error_page_data([error])['error_items_html']
+
+        assert 'data-error-type="funds"' in html_out
+        assert 'error-badge-funds' in html_out
+        assert "strpos(haystack, 'key_error')" in admin_dashboard._ERROR_CATEGORY_SQL
+
+    def test_sql_formatted_timestamp_is_shown(self):
+        """Timestamps formatted by the errors query are rendered verbatim"""
+        error = {'error_type': 'x', 'error_message': '', 'timestamp_str': '2024-01-01 20:00:00 SGT'}
+        html_out = admin_dashboard.get_error_page_data([error])['error_items_html']
+
+        assert '2024-01-01 20:00:00 SGT' in html_out
+
+
+# =============================================================================
+# FEE TIER GROUPING TESTS
+# =============================================================================
+
+class TestUsersByTier:
+    """Test grouping the dashboard user rows into fee tiers"""
+    
+    def test_groups_and_sorts_by_email(self):
+        """Users land in their tier, sorted by email; unknown tiers count as standard"""
+        users = [
+            {'id': 1, 'email': 'zed@x.io', 'fee_tier': 'vip', 'total_profit': 5.0, 'total_trades': 2, 'agent_status': 'active'},
+            {'id': 2, 'email': 'amy@x.io', 'fee_tier': 'vip', 'total_profit': 1.0, 'total_trades': 1, 'agent_status': 'pending'},
+            {'id': 3, 'email': 'bob@x.io', 'fee_tier': 'legacy', 'total_profit': 0, 'total_trades': 0, 'agent_status': 'configured'},
+        ]
+        
+        tiers = admin_dashboard.get_users_by_tier(users)
+        
+        assert [u['email'] for u in tiers['vip']] == ['amy@x.io', 'zed@x.io']
+        assert [u['id'] for u in tiers['standard']] == [3]
+        assert tiers['team'] == []
+        assert tiers['vip'][1]['agent_active'] is True
+    
+    def test_tier_change_drops_cached_users(self):
+        """A successful tier change is visible on the next render"""
+        admin_dashboard.dashboard_cache.set('users', [{'id': 1, 'fee_tier': 'standard'}])
+        admin_dashboard.admin_html_cache.set('W/"1-0"', "<html>old</html>")
+        
+        with patch('admin_dashboard.get_db') as get_db:
+            cur = get_db.return_value.__enter__.return_value.cursor.return_value.__enter__.return_value
+            cur.rowcount = 1
+            assert admin_dashboard.update_user_tier(1, 'vip') is True
+        
+        assert admin_dashboard.dashboard_cache.get('users') is None
+        assert admin_dashboard.admin_html_cache.get('W/"1-0"') is None
@@ -0,0 +1,249 @@
+"""
+Nike Rocket Balance Checker Tests
+=================================
+
+Unit tests for the balance check cycle that don't need a database or Kraken.
+
+Run with: pytest tests/test_balance_checker.py -v
+
+Author: Nike Rocket Team
+"""
+
+import os
+import asyncio
+import pytest
+from decimal import Decimal
+from unittest.mock import patch, AsyncMock
+
+# Add parent directory to path for imports
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import balance_checker
+from balance_checker import BalanceChecker
+
+
+# =============================================================================
+# TEST FIXTURES
+# =============================================================================
+
+class FakeConn:
+    """asyncpg connection stub: answers the lock, table probe and user list"""
+
+    def __init__(self, users, got_lock=True):
+        self.users = users
+        self.got_lock = got_lock
+        self.executed = []
+        self.fetchrow_result = None
+
+    async def fetchval(self, sql, *args):
+        if "pg_try_advisory_lock" in sql:
+            return self.got_lock
+        return True
+
+    async def fetch(self, sql, *args):
+        return self.users
+
+    async def fetchrow(self, sql, *args):
+        self.executed.append(sql)
+        return self.fetchrow_result
+
+    async def execute(self, sql, *args):
+        self.executed.append(sql)
+
+
+class FakePool:
+    """asyncpg pool stub handing out one shared FakeConn"""
+
+    def __init__(self, conn, max_size=20):
+        self.conn = conn
+        self.max_size = max_size
+        self.in_use = 0
+        self.peak = 0
+
+    def get_max_size(self):
+        return self.max_size
+
+    def acquire(self):
+        pool = self
+
+        class _Acquire:
+            async def __aenter__(self):
+                pool.in_use += 1
+                pool.peak = max(pool.peak, pool.in_use)
+                return pool.conn
+
+            async def __aexit__(self, *exc):
+                pool.in_use -= 1
+
+        return _Acquire()
+
+
+def make_users(count):
+    return [
+        {
+            'id': i,
+            'api_key': f'nk_user_{i:02d}_abcdefgh',
+            'kraken_api_key_encrypted': 'enc-key',
+            'kraken_api_secret_encrypted': 'enc-secret',
+        }
+        for i in range(count)
+    ]
+
+
+@pytest.fixture(autouse=True)
+def fake_credentials():
+    """Skip Fernet and keep error reporting away from the DB and email"""
+    with patch('balance_checker.decrypt_credentials', return_value=('key', 'secret')), \
+         patch('balance_checker.log_error_to_db', AsyncMock()), \
+         patch('balance_checker.notify_database_error', AsyncMock()), \
+         patch('balance_checker.notify_critical_error', AsyncMock()):
+        yield
+
+
+# =============================================================================
+# CHECK CYCLE TESTS
+# =============================================================================
+
+class TestCheckAllUsers:
+    """Test the concurrent, single-runner balance check cycle"""
+
+    async def test_failed_check_keeps_completed_readings(self):
+        """Readings from users that finished are flushed even if one check fails"""
+        checker = BalanceChecker(FakePool(FakeConn(make_users(3))))
+
+        async def check(user_id, api_key, key, secret, pending_balances):
+            if user_id == 1:
+                raise Exception("Kraken down")
+            pending_balances.append((100.0 + user_id, user_id))
+
+        with patch.object(checker, 'check_user_balance', side_effect=check), \
+             patch.object(checker, 'update_last_known_balances', AsyncMock()) as flush:
+            await checker.check_all_users()
+
+        flush.assert_awaited_once()
+        assert sorted(flush.call_args[0][0]) == [(100.0, 0), (102.0, 2)]
+
+    async def test_cancelled_cycle_still_flushes(self):
+        """A cycle cancelled mid-way writes the readings it already has"""
+        checker = BalanceChecker(FakePool(FakeConn(make_users(2))))
+
+        async def check(user_id, api_key, key, secret, pending_balances):
+            if user_id == 1:
+                await asyncio.sleep(60)
+            pending_balances.append((50.0, user_id))
+
+        with patch.object(checker, 'check_user_balance', side_effect=check), \
+             patch.object(checker, 'update_last_known_balances', AsyncMock()) as flush:
+            task = asyncio.create_task(checker.check_all_users())
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        flush.assert_awaited_once_with([(50.0, 0)])
+
+    async def test_skips_when_another_worker_holds_the_lock(self):
+        """No users are checked while another worker runs the cycle"""
+        checker = BalanceChecker(FakePool(FakeConn(make_users(2), got_lock=False)))
+
+        with patch.object(checker, '_check_all_users', AsyncMock()) as cycle:
+            await checker.check_all_users()
+
+        cycle.assert_not_awaited()
+
+    async def test_lock_is_released_after_the_cycle(self):
+        """The advisory lock is unlocked even when the cycle raises"""
+        conn = FakeConn(make_users(0))
+        checker = BalanceChecker(FakePool(conn))
+
+        with patch.object(checker, '_check_all_users', AsyncMock(side_effect=RuntimeError("boom"))):
+            with pytest.raises(RuntimeError):
+                await checker.check_all_users()
+
+        assert any("pg_advisory_unlock" in sql for sql in conn.executed)
+
+    async def test_checks_run_concurrently_within_the_limit(self):
+        """Users overlap, but never more than BALANCE_CHECK_CONCURRENCY at once"""
+        checker = BalanceChecker(FakePool(FakeConn(make_users(8))))
+        running = 0
+        peak = 0
+
+        async def check(user_id, api_key, key, secret, pending_balances):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+        with patch('balance_checker.BALANCE_CHECK_CONCURRENCY', 3), \
+             patch.object(checker, 'check_user_balance', side_effect=check):
+            await checker.check_all_users()
+
+        assert peak == 3
+
+    async def test_concurrency_leaves_pool_headroom(self):
+        """A small shared pool caps checks below the configured limit"""
+        pool = FakePool(FakeConn(make_users(8)), max_size=5)
+        checker = BalanceChecker(pool)
+
+        async def check(user_id, api_key, key, secret, pending_balances):
+            async with pool.acquire():
+                await asyncio.sleep(0.01)
+
+        with patch.object(checker, 'check_user_balance', side_effect=check):
+            await checker.check_all_users()
+
+        # Lock connection + 2 checks: 2 of 5 connections stay free
+        assert pool.peak == 3
+
+
+# =============================================================================
+# EXPECTED BALANCE TESTS
+# =============================================================================
+
+class TestExpectedBalance:
+    """Test the single aggregate expected-balance query"""
+
+    async def test_sums_decimals_from_one_query(self):
+        """Initial + deposits - withdrawals + P&L, exact, in one round-trip"""
+        conn = FakeConn([])
+        conn.fetchrow_result = {
+            'initial_capital': Decimal('1000.10'),
+            'deposits': Decimal('250.05'),
+            'withdrawals': Decimal('100.00'),
+            'trading_pnl': Decimal('-12.34'),
+        }
+        checker = BalanceChecker(FakePool(conn))
+
+        expected = await checker.calculate_expected_balance(7, 'nk_user_07_abcdefgh')
+
+        assert expected == Decimal('1137.81')
+        assert isinstance(expected, Decimal)
+        assert len(conn.executed) == 1
+        assert "FILTER" in conn.executed[0]
+
+
+# =============================================================================
+# KRAKEN CLIENT TESTS
+# =============================================================================
+
+class TestExchangeReuse:
+    """Test the shared, rate-limited ccxt client per Kraken key"""
+
+    def test_same_key_reuses_client(self):
+        """Balance and transaction lookups share one throttled client"""
+        checker = BalanceChecker(None)
+
+        first = checker._get_exchange('key', 'secret')
+
+        assert checker._get_exchange('key', 'secret') is first
+        assert first.enableRateLimit is True
+
+    def test_rotated_secret_builds_new_client(self):
+        """A changed secret replaces the cached client"""
+        checker = BalanceChecker(None)
+
+        first = checker._get_exchange('key', 'secret')
+
+        assert checker._get_exchange('key', 'rotated') is not first